@@ -0,0 +1,319 @@
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+from match_store import MatchStore
+from result_store import ResultStore
+from walk_forward import fit_window
+from xi_search import tuned_xi
+
+# bump whenever a change to the model or fitting would alter stored backtest results
+MODEL_VERSION = 2
+# consecutive windows fitted as one warm-started chain; each chain starts cold, so the
+# results do not depend on how many workers there are or how tasks are handed out
+WARM_START_BLOCK = 8
+
+# per-worker state, set up once by _init_worker rather than shipped with every task
+_STORE = None
+_SETTINGS = None
+_PREVIOUS = None
+# wall-clock time the pool was handed its windows, for queue waits
+_SUBMITTED = None
+
+
+def window_descriptors(n_rows, initial_train_size, test_size, num_iterations=None):
+    """(train_start, train_end, test_size) for each rolling window that fits in the data."""
+    if num_iterations is None:
+        num_iterations = (n_rows - initial_train_size) // test_size
+    return [
+        (i * test_size, initial_train_size + i * test_size, test_size)
+        for i in range(num_iterations)
+        if initial_train_size + (i + 1) * test_size <= n_rows
+    ]
+
+
+def window_blocks(descriptors, block=WARM_START_BLOCK):
+    """``descriptors`` split into the warm-start chains ``process_block`` fits."""
+    return [descriptors[i : i + block] for i in range(0, len(descriptors), block)]
+
+
+def _init_worker(store_path, xi, options, sink=None, submitted=None):
+    global _STORE, _SETTINGS, _PREVIOUS, _SUBMITTED
+    started = time.perf_counter()
+    if sink is not None:
+        instrumentation.set_sink(sink)
+    store = MatchStore.load(store_path)
+    _STORE = {
+        "home_codes": store["HomeTeam"],
+        "away_codes": store["AwayTeam"],
+        "home_goals": store["FTHG"],
+        "away_goals": store["FTAG"],
+        "days": store["Date"],
+    }
+    _SETTINGS = {"xi": xi, "options": options}
+    _PREVIOUS = None
+    _SUBMITTED = submitted
+    instrumentation.emit("worker_start", seconds=time.perf_counter() - started)
+
+
+def process_window(descriptor):
+    """
+    Fit and predict one window against the worker's mapped store, warm-started from
+    the worker's previous fit when that was the window just before this one.
+
+    Returns only the test rows' probabilities, the fit diagnostics and the
+    ``train_end`` of the window the fit was warm-started from (-1 for a cold start).
+    With instrumentation on, emits a ``window`` event with how long the window waited
+    after being handed to the pool and how long it took.
+    """
+    global _PREVIOUS
+    started = time.time()
+    train_start, train_end, test_size = descriptor
+    previous, warm_start = None, -1
+    if _PREVIOUS is not None and _PREVIOUS[0] == (
+        train_start - test_size,
+        train_end - test_size,
+        test_size,
+    ):
+        previous, warm_start = _PREVIOUS[1], train_end - test_size
+    probs, fit_info, state = fit_window(
+        _STORE["home_codes"],
+        _STORE["away_codes"],
+        _STORE["home_goals"],
+        _STORE["away_goals"],
+        _STORE["days"],
+        train_start,
+        train_end,
+        test_size,
+        previous=previous,
+        **_SETTINGS
+    )
+    _PREVIOUS = (tuple(descriptor), state)
+    if instrumentation.enabled():
+        instrumentation.emit(
+            "window",
+            train_start=int(train_start),
+            train_end=int(train_end),
+            test_size=int(test_size),
+            warm_start=int(warm_start),
+            queue_wait_seconds=None if _SUBMITTED is None else started - _SUBMITTED,
+            seconds=time.time() - started,
+            converged=fit_info["converged"],
+        )
+    return (
+        np.stack((probs["H"], probs["D"], probs["A"]), axis=1).astype(np.float32),
+        fit_info["converged"],
+        fit_info["iterations"],
+        warm_start,
+    )
+
+
+def process_block(descriptors):
+    """Fit a chain of consecutive windows, the first one cold."""
+    global _PREVIOUS
+    _PREVIOUS = None
+    return [process_window(descriptor) for descriptor in descriptors]
+
+
+def walk_forward_backtest(
+    data,
+    initial_train_size,
+    test_size,
+    num_iterations=None,
+    xi=None,
+    max_workers=7,
+    chunksize=1,
+    options={"maxiter": 200},
+):
+    """
+    Parallel rolling-window Dixon-Coles backtest.
+
+    ``data`` is a ``MatchStore``, the path of a saved one, or a date-indexed match frame
+    (converted to a store). The store is written to disk once and every worker maps it
+    in its initializer, so tasks are just blocks of ``WARM_START_BLOCK`` (train_start,
+    train_end, test_size) tuples, handed out ``chunksize`` blocks at a time. Within a
+    block each fit is warm-started from the one before, so the results are the same
+    for any ``max_workers`` and ``chunksize``. Returns arrays: the store row of each
+    predicted match, its H/D/A probabilities as an (N, 3) float32 array, and the
+    convergence flag, iteration count and warm-start source (``train_end`` of the
+    window, -1 when cold) of the fit that produced it. ``xi`` defaults to
+    ``tuned_xi()``.
+    """
+    if xi is None:
+        xi = tuned_xi()
+    temp_dir = None
+    if isinstance(data, str):
+        store_path = data
+        n_rows = len(MatchStore.load(store_path))
+    else:
+        if isinstance(data, pd.DataFrame):
+            data = MatchStore.from_frames([data.reset_index()])
+        temp_dir = tempfile.mkdtemp(prefix="backtest_")
+        store_path = os.path.join(temp_dir, "matches.fsm")
+        data.save(store_path)
+        n_rows = len(data)
+
+    descriptors = window_descriptors(
+        n_rows, initial_train_size, test_size, num_iterations
+    )
+    try:
+        outputs = list(
+            _map_windows(
+                store_path,
+                window_blocks(descriptors),
+                xi,
+                max_workers,
+                chunksize,
+                options,
+            )
+        )
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if not descriptors:
+        return {
+            "row": np.empty(0, dtype=np.int64),
+            "probs": np.empty((0, 3), dtype=np.float32),
+            "fit_converged": np.empty(0, dtype=bool),
+            "fit_iterations": np.empty(0, dtype=np.int32),
+            "fit_warm_start": np.empty(0, dtype=np.int64),
+        }
+    sizes = [size for _, _, size in descriptors]
+    return {
+        "row": np.concatenate(
+            [np.arange(end, end + size) for _, end, size in descriptors]
+        ),
+        "probs": np.concatenate([output[0] for output in outputs]),
+        "fit_converged": np.repeat([output[1] for output in outputs], sizes),
+        "fit_iterations": np.repeat([output[2] for output in outputs], sizes).astype(
+            np.int32
+        ),
+        "fit_warm_start": np.repeat([output[3] for output in outputs], sizes).astype(
+            np.int64
+        ),
+    }
+
+
+def _map_windows(store_path, blocks, xi, max_workers, chunksize, options):
+    # yields window outputs in descriptor order as soon as each block is done
+    if not blocks:
+        return
+    # workers get the sink too, and every window is queued as the pool starts
+    started = time.time()
+    initargs = (store_path, xi, options, instrumentation.get_sink(), started)
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_init_worker, initargs=initargs
+    ) as executor:
+        for outputs in executor.map(process_block, blocks, chunksize=chunksize):
+            yield from outputs
+    instrumentation.emit(
+        "backtest",
+        windows=sum(len(block) for block in blocks),
+        max_workers=max_workers,
+        chunksize=chunksize,
+        seconds=time.time() - started,
+    )
+
+
+def _check_extends(previous, store):
+    # stored results index rows, so new data may only add matches after the old ones
+    n_rows = len(previous)
+    if n_rows > len(store) or not (
+        np.array_equal(previous["Date"], store["Date"][:n_rows])
+        and np.array_equal(
+            previous.labels("HomeTeam"), store.labels("HomeTeam")[:n_rows]
+        )
+        and np.array_equal(
+            previous.labels("AwayTeam"), store.labels("AwayTeam")[:n_rows]
+        )
+    ):
+        raise ValueError(
+            "match data no longer starts with the matches this run was built on"
+        )
+
+
+def resumable_backtest(
+    data,
+    results_dir,
+    initial_train_size,
+    test_size,
+    num_iterations=None,
+    xi=None,
+    leagues=None,
+    max_workers=7,
+    chunksize=1,
+    options={"maxiter": 200},
+):
+    """
+    ``walk_forward_backtest`` that persists every window to a ``ResultStore``.
+
+    The run is keyed by league set (from the ``Div`` column unless given), xi, window
+    sizes, warm-start block, first match date and ``MODEL_VERSION``. Blocks whose
+    windows are all in the store are skipped, so an interrupted run picks up where it
+    stopped and re-running with new seasons appended only fits the new windows (plus
+    the earlier windows of a block they share, to keep the same warm starts). Returns the open store; use
+    ``store.to_frame()`` or ``result_store.load_results`` to read it.
+    """
+    if xi is None:
+        xi = tuned_xi()
+    if isinstance(data, pd.DataFrame):
+        data = MatchStore.from_frames([data.reset_index()])
+    if leagues is None:
+        leagues = sorted(data.categories["Div"]) if "Div" in data else []
+    key = {
+        "leagues": sorted(leagues),
+        "xi": xi,
+        "initial_train_size": initial_train_size,
+        "test_size": test_size,
+        "first_date": str(data.dates()[0]),
+        "model_version": MODEL_VERSION,
+        "warm_start_block": WARM_START_BLOCK,
+        "options": options,
+    }
+    results = ResultStore(results_dir, key)
+    if results.n_rows:
+        _check_extends(results.matches(), data)
+    store_path = results.save_matches(data)
+
+    descriptors = window_descriptors(
+        len(data), initial_train_size, test_size, num_iterations
+    )
+    blocks = [block for block in window_blocks(descriptors) if results.pending(block)]
+    outputs = _map_windows(store_path, blocks, xi, max_workers, chunksize, options)
+    for descriptor, (probs, converged, iterations, warm_start) in zip(
+        [descriptor for block in blocks for descriptor in block], outputs
+    ):
+        _, train_end, size = descriptor
+        # windows already stored are refitted only as warm starts and not appended
+        results.append(
+            descriptor,
+            {
+                "row": np.arange(train_end, train_end + size),
+                "home_win_prob": probs[:, 0],
+                "draw_win_prob": probs[:, 1],
+                "away_win_prob": probs[:, 2],
+                "fit_converged": np.full(size, converged),
+                "fit_iterations": np.full(size, iterations),
+                "fit_warm_start": np.full(size, warm_start),
+            },
+        )
+    return results
+
+
+def backtest_frame(store, result):
+    """Join backtest arrays onto the matches they predict, in ``process_chunk`` layout."""
+    test_data = store.select(result["row"]).to_frame()
+    test_data["fit_converged"] = result["fit_converged"]
+    test_data["fit_iterations"] = result["fit_iterations"]
+    test_data["fit_warm_start"] = result["fit_warm_start"]
+    test_data["home_win_prob"] = result["probs"][:, 0]
+    test_data["draw_win_prob"] = result["probs"][:, 1]
+    test_data["away_win_prob"] = result["probs"][:, 2]
+    return test_data
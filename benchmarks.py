@@ -0,0 +1,582 @@
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from synthetic import synthetic_league, synthetic_leagues, write_season_files
+
+RESULTS_DIR = os.path.join("data", "benchmarks")
+SEED = 0
+SIZES = {
+    "quick": {
+        "n_teams": 20,
+        "n_seasons": 2,
+        "divisions": 4,
+        "fixtures": 5000,
+        "scalar_fixtures": 100,
+        "windows": 19,
+        "repeats": 2,
+    },
+    "full": {
+        "n_teams": 24,
+        "n_seasons": 4,
+        "divisions": 8,
+        "fixtures": 50000,
+        "scalar_fixtures": 500,
+        "windows": 100,
+        "repeats": 3,
+    },
+}
+# a timing this many times the base run's is reported as a slowdown
+SLOWDOWN_RATIO = 1.25
+# answers that move by more than this (relative) between runs are reported as changed
+ANSWER_TOLERANCE = 1e-6
+
+
+def best_time(func, repeats):
+    """Fastest of ``repeats`` calls to ``func`` in seconds, and its last result."""
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _with_time_diff(frame):
+    frame = frame.copy()
+    frame["time_diff"] = (frame["Date"].max() - frame["Date"]).dt.days
+    return frame
+
+
+def _centred(params):
+    # attack and defence are only identified up to a common shift
+    params = dict(params)
+    attack = [key for key in params if key.startswith("attack_")]
+    shift = np.mean([params[key] for key in attack])
+    for key in attack:
+        params[key] -= shift
+        params["defence_" + key[len("attack_") :]] += shift
+    return params
+
+
+def _log_loss(probs, outcomes):
+    return float(-np.mean(np.log(np.sum(probs * outcomes, axis=1))))
+
+
+def bench_fit(size, seed=SEED):
+    """Fit one league with both solvers and check the known parameters come back."""
+    from dixon_coles import parameter_standard_errors, solve_parameters_decay
+
+    frame, truth = synthetic_league(size["n_teams"], size["n_seasons"], seed)
+    frame = _with_time_diff(frame)
+
+    def fit(**kwargs):
+        np.random.seed(seed)
+        return solve_parameters_decay(frame, xi=0, **kwargs)
+
+    seconds = {}
+    seconds["lbfgs"], fitted = best_time(
+        lambda: fit(reparameterise=True, options={"maxiter": 1000}), size["repeats"]
+    )
+    seconds["slsqp"], constrained = best_time(
+        lambda: fit(analytic_gradient=True, options={"maxiter": 500}), size["repeats"]
+    )
+    fitted, constrained = _centred(fitted), _centred(constrained)
+    errors = parameter_standard_errors(frame, fitted)
+    z = np.array([(fitted[key] - truth[key]) / errors[key] for key in truth])
+    return {
+        "seconds": seconds,
+        "answers": {
+            "home_adv": fitted["home_adv"],
+            "rho": fitted["rho"],
+            "mean_abs_z": float(np.mean(np.abs(z))),
+        },
+        "checks": {
+            # roughly 95% of estimates should be within two standard errors
+            "recovered_within_2se": bool(np.mean(np.abs(z) < 2) >= 0.85),
+            "no_estimate_beyond_4se": bool(np.max(np.abs(z)) < 4),
+            "solvers_agree": bool(
+                max(abs(fitted[key] - constrained[key]) for key in fitted) < 1e-3
+            ),
+        },
+    }
+
+
+def bench_predict(size, seed=SEED):
+    """Batched, cached and scalar 1X2 prediction for random fixtures."""
+    from dixon_coles import (
+        build_fixture_cache,
+        dixon_coles_simulate_match,
+        get_1x2_probs,
+        get_1x2_probs_batch,
+        lookup_matrices,
+        predict_1x2_probs,
+    )
+    from synthetic import synthetic_params
+
+    params = synthetic_params(size["n_teams"], seed=seed)
+    rng = np.random.default_rng(seed)
+    teams = np.array(sorted(key[7:] for key in params if key[:7] == "attack_"))
+    home, offset = rng.integers(0, len(teams), (2, size["fixtures"]))
+    away = (home + 1 + offset % (len(teams) - 1)) % len(teams)
+    fixtures = pd.DataFrame({"HomeTeam": teams[home], "AwayTeam": teams[away]})
+    scalar = fixtures.iloc[: size["scalar_fixtures"]]
+
+    def cached():
+        cache = build_fixture_cache(params)
+        return get_1x2_probs_batch(
+            lookup_matrices(cache, fixtures["HomeTeam"], fixtures["AwayTeam"])
+        )
+
+    def loop():
+        return [
+            get_1x2_probs(dixon_coles_simulate_match(params, home, away))
+            for home, away in zip(scalar["HomeTeam"], scalar["AwayTeam"])
+        ]
+
+    seconds = {}
+    seconds["batched"], batched = best_time(
+        lambda: predict_1x2_probs(params, fixtures), size["repeats"]
+    )
+    seconds["fixture_cache"], from_cache = best_time(cached, size["repeats"])
+    seconds["scalar_loop"], looped = best_time(loop, size["repeats"])
+    batched = np.stack([batched[key] for key in "HDA"], axis=1)
+    from_cache = np.stack([from_cache[key] for key in "HDA"], axis=1)
+    looped = np.array([[probs[key] for key in "HDA"] for probs in looped])
+    return {
+        "seconds": seconds,
+        "answers": dict(
+            zip(["mean_home", "mean_draw", "mean_away"], batched.mean(axis=0).tolist())
+        ),
+        "checks": {
+            "batched_matches_scalar": bool(
+                np.max(np.abs(batched[: len(looped)] - looped)) < 1e-10
+            ),
+            "cache_matches_batched": bool(np.max(np.abs(from_cache - batched)) < 1e-6),
+            "probabilities_sum_to_one": bool(
+                np.all(np.abs(batched.sum(axis=1) - 1) < 1e-2)
+            ),
+        },
+    }
+
+
+def bench_get_data(size, seed=SEED):
+    """Download and parse every synthetic season file from a local server."""
+    from bettools import get_data
+    from fixture_server import serve_fixtures
+
+    divisions = ["D{}".format(i) for i in range(size["divisions"])]
+    frame, _ = synthetic_leagues(
+        divisions, size["n_teams"], size["n_seasons"], seed=seed
+    )
+    seasons = sorted(frame["Season"].unique())
+    with tempfile.TemporaryDirectory() as directory:
+        write_season_files(frame, directory)
+        with serve_fixtures(directory) as url:
+            seconds, frames = best_time(
+                lambda: get_data(seasons, divisions, base_url=url, cache_dir=None),
+                size["repeats"],
+            )
+    loaded = pd.concat(frames).sort_values(["Date", "Div", "HomeTeam"])
+    expected = frame.sort_values(["Date", "Div", "HomeTeam"])
+    columns = ["Date", "HomeTeam", "AwayTeam", "FTHG", "FTAG", "PSH", "PSD", "PSA"]
+    columns += ["home_max_odds", "draw_max_odds", "away_max_odds"]
+    return {
+        "seconds": {"get_data": seconds},
+        "answers": {"rows": len(loaded)},
+        "checks": {
+            "round_trip": bool(
+                len(loaded) == len(expected)
+                and all(
+                    np.array_equal(loaded[column].to_numpy(), expected[column])
+                    for column in columns
+                )
+            )
+        },
+    }
+
+
+def _staking_loop(selected, kelly_fraction, starting_bankroll=100):
+    # the per-bet loop simulate_staking replaced, as a reference
+    from bettools import kelly_criterion
+
+    bankroll = starting_bankroll
+    for ev, prob, odds, won in zip(
+        selected["ev"], selected["prob"], selected["odds"], selected["won"]
+    ):
+        if ev <= 0:
+            continue
+        stake = kelly_criterion(prob, odds, bankroll, kelly_fraction)
+        bankroll += stake * (odds - 1) if won else -stake
+    return bankroll
+
+
+def bench_staking(size, seed=SEED):
+    """Every staking strategy at once against the per-bet loop for one of them."""
+    from staking import (
+        flat_strategy,
+        kelly_sweep,
+        result_outcomes,
+        select_bets,
+        simulate_staking,
+    )
+
+    divisions = ["D{}".format(i) for i in range(size["divisions"])]
+    frame, _ = synthetic_leagues(
+        divisions, size["n_teams"], size["n_seasons"], seed=seed
+    )
+    probs = frame[["true_home_prob", "true_draw_prob", "true_away_prob"]].to_numpy()
+    odds = frame[["home_max_odds", "draw_max_odds", "away_max_odds"]].to_numpy()
+    outcomes = result_outcomes(frame["FTHG"], frame["FTAG"])
+    strategies = kelly_sweep(np.round(np.linspace(0.01, 0.2, 20), 2))
+    strategies.append(flat_strategy())
+
+    seconds = {}
+    seconds["simulate_staking"], result = best_time(
+        lambda: simulate_staking(probs, odds, outcomes, strategies), size["repeats"]
+    )
+    selected = select_bets(probs, odds, outcomes)
+    seconds["kelly_loop"], looped = best_time(
+        lambda: _staking_loop(selected, 0.05), size["repeats"]
+    )
+    summary = result["summary"]
+    return {
+        "seconds": seconds,
+        "answers": {
+            "kelly_0.05_final": float(summary.loc["kelly_0.05", "final_bankroll"]),
+            "flat_final": float(summary.loc["flat_1.0", "final_bankroll"]),
+            "sweep_total": float(summary["final_bankroll"].sum()),
+            "bets": int(summary.loc["kelly_0.05", "bets"]),
+        },
+        "checks": {
+            "matches_loop": bool(
+                np.isclose(summary.loc["kelly_0.05", "final_bankroll"], looped)
+            )
+        },
+    }
+
+
+def _ratings_loop(frame, home_prob, away_prob):
+    # the original row-by-row ratings, as a reference
+    ratings = {}
+    match_rating = np.empty(len(frame))
+    rows = zip(
+        frame["HomeTeam"], frame["AwayTeam"], frame["FTHG"], frame["FTAG"], home_prob
+    )
+    for i, (home, away, home_goals, away_goals, home_p) in enumerate(rows):
+        home_prior, away_prior = ratings.get(home, 0.0), ratings.get(away, 0.0)
+        match_rating[i] = away_prior - home_prior
+        ratings[home] = home_prior + (home_goals > away_goals) - home_p
+        ratings[away] = away_prior + (home_goals < away_goals) - away_prob[i]
+    return match_rating
+
+
+def bench_ratings(size, seed=SEED):
+    """Market-residual ratings over several divisions, vectorised and parallel."""
+    from bettools import remove_margin
+    from ratings import add_market_ratings
+
+    divisions = ["D{}".format(i) for i in range(size["divisions"])]
+    frame, _ = synthetic_leagues(
+        divisions, size["n_teams"], size["n_seasons"], seed=seed
+    )
+    fair = remove_margin(frame[["PSH", "PSD", "PSA"]], "power")["probs"]
+    frame["fair_PSH"], frame["fair_PSA"] = 1 / fair[:, 0], 1 / fair[:, 2]
+
+    seconds = {}
+    seconds["vectorised"], rated = best_time(
+        lambda: add_market_ratings(frame, max_workers=1), size["repeats"]
+    )
+    seconds["parallel"], parallel = best_time(
+        lambda: add_market_ratings(frame), size["repeats"]
+    )
+    seconds["loop"], looped = best_time(
+        lambda: _ratings_loop(frame, fair[:, 0], fair[:, 2]), size["repeats"]
+    )
+    match_rating = rated["match_rating"].to_numpy()
+    # a few matches without odds must only blank out the teams that played them
+    gaps = frame.copy()
+    gaps.loc[:: len(gaps) // 5, "fair_PSH"] = np.nan
+    gap_rating = add_market_ratings(gaps, max_workers=1)["match_rating"].to_numpy()
+    gap_loop = _ratings_loop(gaps, 1 / gaps["fair_PSH"].to_numpy(), fair[:, 2])
+    return {
+        "seconds": seconds,
+        "answers": {"mean_abs_match_rating": float(np.mean(np.abs(match_rating)))},
+        "checks": {
+            "matches_loop": bool(np.allclose(match_rating, looped, atol=1e-9)),
+            "parallel_matches_serial": bool(
+                np.allclose(parallel["match_rating"], match_rating, atol=1e-9)
+            ),
+            "missing_odds_match_loop": bool(
+                np.allclose(gap_rating, gap_loop, atol=1e-9, equal_nan=True)
+            ),
+        },
+    }
+
+
+def bench_backtest(size, seed=SEED):
+    """
+    Walk-forward backtest of one league, serial and in parallel, then staked.
+
+    The model's log loss on the predicted matches must come close to that of the
+    probabilities the results were drawn from.
+    """
+    from backtest import walk_forward_backtest
+    from dixon_coles import DEFAULT_XI
+    from staking import kelly_strategy, result_outcomes, simulate_staking
+    from walk_forward import walk_forward_validation
+
+    n_teams = size["n_teams"]
+    frame, _ = synthetic_league(n_teams, size["n_seasons"], seed)
+    data = frame.set_index("Date")
+    settings = {
+        # a season of history, then one matchday per window
+        "initial_train_size": n_teams * (n_teams - 1),
+        "test_size": n_teams // 2,
+        "num_iterations": size["windows"],
+        "xi": DEFAULT_XI,
+    }
+
+    def serial():
+        results = walk_forward_validation(data, **settings)
+        return pd.concat(results, ignore_index=True)
+
+    def end_to_end():
+        result = walk_forward_backtest(
+            data, max_workers=min(4, os.cpu_count() or 1), **settings
+        )
+        rows = frame.iloc[result["row"]]
+        return result, simulate_staking(
+            result["probs"],
+            rows[["home_max_odds", "draw_max_odds", "away_max_odds"]].to_numpy(),
+            result_outcomes(rows["FTHG"], rows["FTAG"]),
+            [kelly_strategy(0.05)],
+        )
+
+    seconds = {}
+    seconds["walk_forward"], predicted = best_time(serial, size["repeats"])
+    seconds["parallel_and_staking"], (result, staked) = best_time(
+        end_to_end, size["repeats"]
+    )
+    probs = predicted[["home_win_prob", "draw_win_prob", "away_win_prob"]].to_numpy()
+    rows = frame.iloc[result["row"]]
+    outcomes = result_outcomes(rows["FTHG"], rows["FTAG"])
+    true_probs = rows[["true_home_prob", "true_draw_prob", "true_away_prob"]]
+    log_loss = _log_loss(probs, outcomes)
+    true_log_loss = _log_loss(true_probs.to_numpy(), outcomes)
+    return {
+        "seconds": seconds,
+        "answers": {
+            "log_loss": log_loss,
+            "true_log_loss": true_log_loss,
+            "final_bankroll": float(staked["summary"]["final_bankroll"].iloc[0]),
+        },
+        "checks": {
+            "close_to_true_model": bool(log_loss - true_log_loss < 0.05),
+            "parallel_matches_serial": bool(
+                np.max(np.abs(result["probs"] - probs)) < 1e-3
+            ),
+            "all_converged": bool(
+                predicted["fit_converged"].all() and result["fit_converged"].all()
+            ),
+        },
+    }
+
+
+BENCHMARKS = {
+    "fit": bench_fit,
+    "predict": bench_predict,
+    "get_data": bench_get_data,
+    "staking": bench_staking,
+    "ratings": bench_ratings,
+    "backtest": bench_backtest,
+}
+
+
+def current_commit():
+    """The checked-out commit, and whether the working tree has uncommitted changes."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", True
+    return commit, bool(status.strip())
+
+
+def run_benchmarks(names=None, size="quick", seed=SEED):
+    """
+    Run the named benchmarks (all of them by default) on synthetic data.
+
+    Returns a record of each benchmark's best timings, the answers it computed and the
+    checks on them, along with the commit and environment it ran in.
+    """
+    import scipy
+
+    commit, dirty = current_commit()
+    record = {
+        "commit": commit,
+        "dirty": dirty,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "size": size,
+        "seed": seed,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scipy": scipy.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "benchmarks": {},
+    }
+    for name in names or BENCHMARKS:
+        record["benchmarks"][name] = BENCHMARKS[name](SIZES[size], seed)
+    return record
+
+
+def save_results(record, directory=RESULTS_DIR):
+    """Write a run to ``<directory>/<commit>[-dirty]-<size>.json``; returns the path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(
+        directory,
+        "{}{}-{}.json".format(
+            record["commit"][:12], "-dirty" if record["dirty"] else "", record["size"]
+        ),
+    )
+    with open(path, "w") as results_file:
+        json.dump(record, results_file, indent=1)
+    return path
+
+
+def load_results(ref, size="quick", directory=RESULTS_DIR):
+    """A saved run, by path or by (a prefix of) its commit hash."""
+    if os.path.exists(ref):
+        path = ref
+    else:
+        matches = sorted(
+            glob.glob(os.path.join(directory, "{}*-{}.json".format(ref[:12], size)))
+        )
+        if not matches:
+            raise FileNotFoundError("No {} benchmark run for {}".format(size, ref))
+        # a clean run of the commit over a dirty one
+        clean = [
+            match for match in matches if not match.endswith("-dirty-" + size + ".json")
+        ]
+        path = (clean or matches)[0]
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def _answers_differ(base, head):
+    base, head = np.asarray(base, dtype=float), np.asarray(head, dtype=float)
+    if base.shape != head.shape:
+        return True
+    return not np.allclose(head, base, rtol=ANSWER_TOLERANCE, atol=0)
+
+
+def compare_results(base, head):
+    """
+    Timings, answers and checks of two runs side by side.
+
+    One row per timing (with the head / base ratio and whether it is past
+    ``SLOWDOWN_RATIO``), per answer (flagged when it moved) and per check (flagged when
+    it fails in the head run).
+    """
+    rows = []
+    for name, result in head["benchmarks"].items():
+        previous = base["benchmarks"].get(name)
+        if previous is None:
+            continue
+        for metric, seconds in result["seconds"].items():
+            before = previous["seconds"].get(metric, np.nan)
+            rows.append(
+                (
+                    name,
+                    "seconds",
+                    metric,
+                    before,
+                    seconds,
+                    seconds / before,
+                    seconds / before > SLOWDOWN_RATIO,
+                )
+            )
+        for metric, value in result["answers"].items():
+            before = previous["answers"].get(metric)
+            changed = before is None or _answers_differ(before, value)
+            rows.append((name, "answer", metric, before, value, np.nan, changed))
+        for metric, passed in result["checks"].items():
+            before = previous["checks"].get(metric)
+            rows.append((name, "check", metric, before, passed, np.nan, not passed))
+    return pd.DataFrame(
+        rows,
+        columns=["benchmark", "kind", "metric", "base", "head", "ratio", "flagged"],
+    )
+
+
+def _print_record(record):
+    for name, result in record["benchmarks"].items():
+        timings = ", ".join(
+            "{} {:.4f}s".format(metric, seconds)
+            for metric, seconds in result["seconds"].items()
+        )
+        failed = [check for check, passed in result["checks"].items() if not passed]
+        print(
+            "{:<10} {}  {}".format(
+                name, timings, "FAILED " + ", ".join(failed) if failed else "ok"
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks on synthetic leagues.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="run and save the benchmarks")
+    run.add_argument("names", nargs="*", help=", ".join(BENCHMARKS))
+    run.add_argument("--size", choices=list(SIZES), default="quick")
+    run.add_argument("--seed", type=int, default=SEED)
+    run.add_argument("--no-save", action="store_true")
+    compare = commands.add_parser("compare", help="compare two saved runs")
+    compare.add_argument("base")
+    compare.add_argument("head", nargs="?")
+    compare.add_argument("--size", choices=list(SIZES), default="quick")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        unknown = set(args.names) - set(BENCHMARKS)
+        if unknown:
+            parser.error("unknown benchmarks: " + ", ".join(sorted(unknown)))
+        record = run_benchmarks(args.names, args.size, args.seed)
+        _print_record(record)
+        if not args.no_save:
+            print("saved to", save_results(record))
+        passed = all(
+            all(result["checks"].values()) for result in record["benchmarks"].values()
+        )
+        sys.exit(0 if passed else 1)
+
+    head = args.head or current_commit()[0]
+    comparison = compare_results(
+        load_results(args.base, args.size), load_results(head, args.size)
+    )
+    with pd.option_context("display.width", 200, "display.max_rows", None):
+        print(comparison.to_string(index=False))
+    sys.exit(1 if comparison["flagged"].any() else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,40 @@
+import datetime
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import pandas as pd
-from scipy.optimize import minimize
-from scipy.stats import poisson
+
+# requests and scipy are imported where they are used: loading this module for the
+# betting maths, or in a pool worker, should not pay for the HTTP stack and scipy.stats
+
+BASE_URL = "https://www.football-data.co.uk/mmz4281"
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "FOOTBALL_STATS_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "football_stats"),
+)
+
+# how long a cached copy of a season that is still being played counts as fresh
+CURRENT_SEASON_MAX_AGE = 6 * 60 * 60
+
+BOOKMAKERS = ["B365", "BW", "IW", "PS", "WH", "VC"]
+
+# concurrent downloads in get_data, and the size of the shared connection pool
+DEFAULT_MAX_WORKERS = 8
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_TIMEOUT = 30
+
+# one session per connection pool size, so every get_data worker keeps its connection
+_SESSIONS = {}
+_SESSION_LOCK = threading.Lock()
 
 
 def generate_seasons(start_year, end_year):
@@ -13,7 +46,204 @@ def generate_seasons(start_year, end_year):
     return seasons
 
 
-def get_data(season_list, league_list, additional_cols=[]):
+def season_is_finished(season, today=None):
+    """
+    Whether a season code such as "2324" is over, in which case its file will not change.
+    Seasons are treated as finished from the 1st of July of their second year; codes
+    starting above 50 are 20th-century seasons, so "9394" is 1993-94.
+    """
+    if today is None:
+        today = datetime.date.today()
+    start = int(season[:2])
+    start += 1900 if start > 50 else 2000
+    return today >= datetime.date(start + 1, 7, 1)
+
+
+def get_session(pool_size=DEFAULT_MAX_WORKERS):
+    """
+    The keep-alive session shared by downloads running ``pool_size`` at a time, with a
+    connection pool of that size and retries with exponential backoff on connection
+    errors and 429/5xx responses.
+    """
+    pool_size = max(int(pool_size), 1)
+    with _SESSION_LOCK:
+        if pool_size not in _SESSIONS:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            retry = Retry(
+                total=DOWNLOAD_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+            )
+            adapter = HTTPAdapter(
+                pool_connections=pool_size,
+                pool_maxsize=pool_size,
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _SESSIONS[pool_size] = session
+        return _SESSIONS[pool_size]
+
+
+def _download(url, pool_size=DEFAULT_MAX_WORKERS):
+    response = get_session(pool_size).get(url, timeout=DOWNLOAD_TIMEOUT)
+    response.raise_for_status()
+    return response.content
+
+
+def decode_csv_bytes(content):
+    """Decode a downloaded csv: utf-8 (with or without a BOM) if it is valid, else latin-1."""
+    try:
+        return content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return content.decode("latin")
+
+
+def read_season_csv(content):
+    return pd.read_csv(io.StringIO(decode_csv_bytes(content)))
+
+
+def prepare_season_frame(df):
+    """Parse the dates and add the best-price columns across ``BOOKMAKERS``."""
+    try:
+        df["Date"] = pd.to_datetime(df["Date"], format="%d/%m/%y")
+    except ValueError:
+        df["Date"] = pd.to_datetime(df["Date"], format="%d/%m/%Y")
+    for outcome, col in (("H", "home"), ("A", "away"), ("D", "draw")):
+        existing_columns = [
+            book + outcome for book in BOOKMAKERS if book + outcome in df.columns
+        ]
+        df[col + "_max_odds"] = df[existing_columns].max(axis=1)
+    return df
+
+
+def _write_atomic(path, write):
+    # a unique temp file per call: get_data's threads may write the same key at once
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _write_cached_frame(df, path):
+    # pickle keeps every column's dtype without an extra dependency such as pyarrow
+    _write_atomic(path + ".pkl", df.to_pickle)
+
+
+def _read_cached_frame(path):
+    if not os.path.exists(path + ".pkl") and os.path.exists(path + ".parquet"):
+        # written by earlier versions when pyarrow was installed
+        return pd.read_parquet(path + ".parquet")
+    return pd.read_pickle(path + ".pkl")
+
+
+def load_season(
+    season,
+    league,
+    base_url=BASE_URL,
+    cache_dir=DEFAULT_CACHE_DIR,
+    offline=False,
+    max_age=CURRENT_SEASON_MAX_AGE,
+    pool_size=DEFAULT_MAX_WORKERS,
+):
+    """
+    One season of one league, with dates parsed and max-odds columns added.
+
+    With a ``cache_dir`` the prepared frame is stored under the sha256 of the downloaded
+    file, and a small index entry per url records which content it last pointed at.
+    A finished season is never downloaded again once the cached copy was fetched after
+    it ended; anything else (the current season, or a copy cached while the season was
+    still being played) is revalidated once its entry is older than ``max_age`` seconds
+    (an unchanged file is not re-parsed).
+    ``offline=True`` only reads the cache and raises FileNotFoundError on a miss.
+    ``pool_size`` is how many downloads run at once, which sizes the session's pool. If
+    revalidating fails (the site is down, no network) the cached copy is returned with
+    a warning.
+    """
+    url = "{}/{}/{}.csv".format(base_url.rstrip("/"), season, league)
+    if cache_dir is None:
+        if offline:
+            raise FileNotFoundError("Offline without a cache: {}".format(url))
+        return prepare_season_frame(read_season_csv(_download(url, pool_size)))
+
+    url_key = hashlib.sha256(url.encode()).hexdigest()[:16]
+    index_path = os.path.join(
+        cache_dir, "index", "{}_{}_{}.json".format(season, league, url_key)
+    )
+    entry = None
+    if os.path.exists(index_path):
+        with open(index_path) as index_file:
+            entry = json.load(index_file)
+    if entry is not None:
+        frame_path = os.path.join(cache_dir, "frames", entry["sha256"])
+        fetched = datetime.date.fromtimestamp(entry["fetched"])
+        # a copy from before the season ended may be missing its last matches
+        fresh = (
+            season_is_finished(season, today=fetched)
+            or time.time() - entry["fetched"] < max_age
+        )
+        if fresh or offline:
+            return _read_cached_frame(frame_path)
+    if offline:
+        raise FileNotFoundError("Not in the local cache: {}".format(url))
+
+    try:
+        content = _download(url, pool_size)
+    except OSError as error:
+        # requests' exceptions are OSErrors; a stale copy beats no data
+        if entry is None:
+            raise
+        warnings.warn(
+            "Could not refresh {} ({}); using the copy cached at {}".format(
+                url, error, time.ctime(entry["fetched"])
+            )
+        )
+        return _read_cached_frame(frame_path)
+    digest = hashlib.sha256(content).hexdigest()
+    frame_path = os.path.join(cache_dir, "frames", digest)
+    os.makedirs(os.path.dirname(frame_path), exist_ok=True)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    if os.path.exists(frame_path + ".parquet") or os.path.exists(frame_path + ".pkl"):
+        df = _read_cached_frame(frame_path)
+    else:
+        df = prepare_season_frame(read_season_csv(content))
+        _write_cached_frame(df, frame_path)
+    entry = {"url": url, "sha256": digest, "fetched": time.time()}
+
+    def write_index(tmp):
+        with open(tmp, "w") as index_file:
+            json.dump(entry, index_file)
+
+    _write_atomic(index_path, write_index)
+    return df
+
+
+def get_data(
+    season_list,
+    league_list,
+    additional_cols=[],
+    base_url=BASE_URL,
+    cache_dir=DEFAULT_CACHE_DIR,
+    offline=False,
+    max_workers=DEFAULT_MAX_WORKERS,
+):
+    """
+    One frame per (season, league), in season-major order.
+
+    Files are fetched by up to ``max_workers`` threads over a keep-alive session whose
+    connection pool is sized to match,
+    and each file is parsed in its worker while the others are still downloading.
+    """
 
     col_list = [
         "Div",
@@ -33,76 +263,64 @@ def get_data(season_list, league_list, additional_cols=[]):
     for col in additional_cols:
         col_list.append(col)
 
-    df_ls = []
-
-    bookmakers = ["B365", "BW", "IW", "PS", "WH", "VC"]
-
-    home_cols = []
-    away_cols = []
-    draw_cols = []
-
-    for book in bookmakers:
-        home_col = book + "H"
-        home_cols.append(home_col)
-
-    for book in bookmakers:
-        away_col = book + "A"
-        away_cols.append(away_col)
-
-    for book in bookmakers:
-        draw_col = book + "D"
-        draw_cols.append(draw_col)
-
-    for season in season_list:
-        for league in league_list:
-            try:
-                df = pd.read_csv(
-                    f"https://www.football-data.co.uk/mmz4281/{season}/{league}.csv"
-                )
-            except:
-                df = pd.read_csv(
-                    f"https://www.football-data.co.uk/mmz4281/{season}/{league}.csv",
-                    encoding="latin",
-                )
-            try:
-                df["Date"] = pd.to_datetime(df["Date"], format="%d/%m/%y")
-            except ValueError:
-                df["Date"] = pd.to_datetime(df["Date"], format="%d/%m/%Y")
-            existing_home_columns = [col for col in home_cols if col in df.columns]
-            existing_away_columns = [col for col in away_cols if col in df.columns]
-            existing_draw_columns = [col for col in draw_cols if col in df.columns]
-
-            df["home_max_odds"] = df[existing_home_columns].max(axis=1)
-            df["away_max_odds"] = df[existing_away_columns].max(axis=1)
-            df["draw_max_odds"] = df[existing_draw_columns].max(axis=1)
-
-            df = df[col_list]
-            df_ls.append(df)
-    return df_ls
+    pairs = [(season, league) for season in season_list for league in league_list]
+
+    def load(pair):
+        season, league = pair
+        df = load_season(
+            season,
+            league,
+            base_url=base_url,
+            cache_dir=cache_dir,
+            offline=offline,
+            pool_size=max_workers,
+        )
+        return df[col_list]
 
+    if max_workers <= 1 or len(pairs) <= 1:
+        return [load(pair) for pair in pairs]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(load, pairs))
 
-def calculate_poisson_match_outcomes(home_goals_expectation, away_goals_expectation):
-    max_goals = 10
-    home_probabilities = [
-        poisson.pmf(i, home_goals_expectation) for i in range(0, max_goals + 1)
-    ]
-    away_probabilities = [
-        poisson.pmf(i, away_goals_expectation) for i in range(0, max_goals + 1)
-    ]
 
-    home_win_prob = sum(
-        home_probabilities[i] * sum(away_probabilities[:i])
-        for i in range(1, max_goals + 1)
-    )
-    draw_prob = sum(
-        home_probabilities[i] * away_probabilities[i] for i in range(max_goals + 1)
-    )
-    away_win_prob = sum(
-        away_probabilities[i] * sum(home_probabilities[:i])
-        for i in range(1, max_goals + 1)
+def calculate_poisson_match_outcomes(home_goals_expectation, away_goals_expectation):
+    probs = poisson_match_outcomes_batch(
+        [home_goals_expectation], [away_goals_expectation]
     )
+    return [float(probs["H"][0]), float(probs["D"][0]), float(probs["A"][0])]
+
 
-    return [home_win_prob, draw_prob, away_win_prob]
+def poisson_match_outcomes_batch(
+    home_goals_expectation, away_goals_expectation, max_goals=10
+):
+    """
+    Home win, draw and away win probabilities for arrays of independent Poisson means.
+
+    Scores above ``max_goals`` for either side are left out, as in
+    ``calculate_poisson_match_outcomes``, and the probability they carry is returned as
+    ``tail``. With ``max_goals=None`` the goal difference is Skellam distributed and the
+    probabilities are exact (``tail`` is zero). Returns a dict of arrays H, D, A, tail.
+    """
+    home = np.asarray(home_goals_expectation, dtype=float)
+    away = np.asarray(away_goals_expectation, dtype=float)
+    if max_goals is None:
+        from scipy.stats import skellam
+
+        return {
+            "H": skellam.sf(0, home, away),
+            "D": skellam.pmf(0, home, away),
+            "A": skellam.cdf(-1, home, away),
+            "tail": np.zeros(np.shape(home)),
+        }
+    home_pmf, _ = _poisson_pmfs(home.ravel(), max_goals)
+    away_pmf, _ = _poisson_pmfs(away.ravel(), max_goals)
+    probs = _outcome_probs(home_pmf, away_pmf).reshape(home.shape + (3,))
+    return {
+        "H": probs[..., 0],
+        "D": probs[..., 1],
+        "A": probs[..., 2],
+        "tail": 1 - probs.sum(axis=-1),
+    }
 
 
 def calculate_ev_from_odds(bookmaker_odds, your_probability):
@@ -114,46 +332,151 @@ def calculate_ev_from_odds(bookmaker_odds, your_probability):
 def find_best_fit_goals(prob_home_win, prob_draw, prob_away_win):
     """
     Find the expected goals for home and away teams that best fit the given win, draw, and away win probabilities.
-    This is a simplified estimation and does not perform a complex optimization due to the complexity of the task.
-    """
-    # Initial guesses for average goals scored by home and away teams
-    avg_goals_home = 1.4
-    avg_goals_away = 1.1
-
-    # Define a simple error function to minimize
-    def error_function(guess):
-        home, away = guess
-        # Calculate win, draw, and lose probabilities using Poisson distribution
-        max_goals = 10  # Maximum number of goals to consider for calculation
-        prob_draw_estimated = sum(
-            poisson.pmf(i, home) * poisson.pmf(i, away) for i in range(max_goals)
-        )
-        prob_home_win_estimated = sum(
-            poisson.pmf(i, home) * sum(poisson.pmf(j, away) for j in range(i))
-            for i in range(1, max_goals)
-        )
-        prob_away_win_estimated = sum(
-            poisson.pmf(i, away) * sum(poisson.pmf(j, home) for j in range(i))
-            for i in range(1, max_goals)
-        )
+    See ``expected_goals_from_probs`` to do many matches at once.
+    """
+    home_goals, away_goals = expected_goals_from_probs(
+        [prob_home_win], [prob_draw], [prob_away_win]
+    )
+    if np.isnan(home_goals[0]):
+        return None
+    return float(home_goals[0]), float(away_goals[0])
+
+
+def _poisson_pmfs(means, max_goals):
+    # (N, max_goals + 1) pmfs and their derivatives with respect to the mean
+    means = np.asarray(means, dtype=float)[:, None]
+    # exp(-m) m^k / k! as a running product, much cheaper than poisson.pmf
+    ratios = means / np.arange(1, max_goals + 1)
+    pmf = np.exp(-means) * np.hstack((np.ones_like(means), np.cumprod(ratios, axis=1)))
+    shifted = np.hstack((np.zeros((len(pmf), 1)), pmf[:, :-1]))
+    return pmf, shifted - pmf
+
+
+def _outcome_probs(home_pmf, away_pmf):
+    # home win / draw / away win from per-match goal distributions, in (N,) arrays
+    away_below = np.cumsum(away_pmf, axis=1) - away_pmf
+    home_below = np.cumsum(home_pmf, axis=1) - home_pmf
+    return np.stack(
+        (
+            np.sum(home_pmf * away_below, axis=1),
+            np.sum(home_pmf * away_pmf, axis=1),
+            np.sum(away_pmf * home_below, axis=1),
+        ),
+        axis=1,
+    )
 
-        # Error based on the difference between estimated and actual probabilities
-        error = (
-            (prob_home_win_estimated - prob_home_win) ** 2
-            + (prob_draw_estimated - prob_draw) ** 2
-            + (prob_away_win_estimated - prob_away_win) ** 2
-        )
-        return error
 
-    # Use optimization to minimize the error function
-    initial_guess = [avg_goals_home, avg_goals_away]
-    result = minimize(error_function, initial_guess, bounds=((0, None), (0, None)))
+def build_outcome_grid(max_mean=6.0, points=300, max_goals=10):
+    """
+    Home / draw / away probabilities for a dense grid of independent Poisson means.
+
+    Returns a dict with the grid's ``means`` axis and ``probs`` of shape
+    (points, points, 3), indexed [home mean, away mean].
+    """
+    means = np.linspace(max_mean / points, max_mean, points)
+    pmf, _ = _poisson_pmfs(means, max_goals)
+    home_pmf = np.repeat(pmf, points, axis=0)
+    away_pmf = np.tile(pmf, (points, 1))
+    probs = _outcome_probs(home_pmf, away_pmf).reshape(points, points, 3)
+    return {"means": means, "probs": probs, "max_goals": max_goals}
+
+
+_OUTCOME_GRIDS = {}
+
 
-    if result.success:
-        fitted_goals_home, fitted_goals_away = result.x
-        return fitted_goals_home, fitted_goals_away
+def load_outcome_grid(
+    cache_dir=DEFAULT_CACHE_DIR, max_mean=6.0, points=300, max_goals=10
+):
+    """
+    ``build_outcome_grid`` output, built once and then kept in ``cache_dir`` (and in
+    memory) for later sessions. ``cache_dir=None`` skips the disk copy.
+    """
+    key = (max_mean, points, max_goals)
+    if key in _OUTCOME_GRIDS:
+        return _OUTCOME_GRIDS[key]
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(
+            cache_dir, "outcome_grid_{}_{}_{}.npz".format(max_mean, points, max_goals)
+        )
+    if path is not None and os.path.exists(path):
+        with np.load(path) as saved:
+            grid = {name: saved[name] for name in saved.files}
+        grid["max_goals"] = int(grid["max_goals"])
     else:
-        return None
+        grid = build_outcome_grid(max_mean, points, max_goals)
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+            def write_grid(tmp):
+                with open(tmp, "wb") as grid_file:
+                    np.savez(grid_file, **grid)
+
+            _write_atomic(path, write_grid)
+    _OUTCOME_GRIDS[key] = grid
+    return grid
+
+
+def expected_goals_from_probs(
+    prob_home_win,
+    prob_draw,
+    prob_away_win,
+    iterations=6,
+    cache_dir=DEFAULT_CACHE_DIR,
+):
+    """
+    Invert arrays of 1X2 probabilities to the independent Poisson expected goals that
+    reproduce them most closely (least squares, as ``find_best_fit_goals``).
+
+    Each match starts from the nearest point of the cached ``load_outcome_grid`` and is
+    refined by a few batched Gauss-Newton steps with the analytic Jacobian. Returns
+    arrays of home and away expected goals, NaN where a probability is missing.
+    """
+    target = np.stack(
+        [np.asarray(p, dtype=float) for p in (prob_home_win, prob_draw, prob_away_win)],
+        axis=1,
+    )
+    grid = load_outcome_grid(cache_dir=cache_dir)
+    means, max_goals = grid["means"], grid["max_goals"]
+    n_means = len(means)
+    valid = ~np.any(np.isnan(target), axis=1)
+
+    # nearest grid point in (home, draw, away) space
+    if "tree" not in grid:
+        from scipy.spatial import cKDTree
+
+        grid["tree"] = cKDTree(grid["probs"].reshape(-1, 3))
+    nearest = grid["tree"].query(target[valid])[1]
+    home = means[nearest // n_means]
+    away = means[nearest % n_means]
+
+    for _ in range(iterations):
+        home_pmf, home_slope = _poisson_pmfs(home, max_goals)
+        away_pmf, away_slope = _poisson_pmfs(away, max_goals)
+        residual = _outcome_probs(home_pmf, away_pmf) - target[valid]
+        # columns of the (N, 3, 2) Jacobian by product rule on each outcome sum
+        jacobian = np.stack(
+            (
+                _outcome_probs(home_slope, away_pmf),
+                _outcome_probs(home_pmf, away_slope),
+            ),
+            axis=2,
+        )
+        # 2x2 normal equations, solved in closed form
+        a = np.sum(jacobian[:, :, 0] ** 2, axis=1) + 1e-12
+        b = np.sum(jacobian[:, :, 0] * jacobian[:, :, 1], axis=1)
+        c = np.sum(jacobian[:, :, 1] ** 2, axis=1) + 1e-12
+        g_home = np.sum(jacobian[:, :, 0] * residual, axis=1)
+        g_away = np.sum(jacobian[:, :, 1] * residual, axis=1)
+        det = a * c - b**2
+        home = np.maximum(home - (c * g_home - b * g_away) / det, 1e-6)
+        away = np.maximum(away - (a * g_away - b * g_home) / det, 1e-6)
+
+    home_goals = np.full(len(target), np.nan)
+    away_goals = np.full(len(target), np.nan)
+    home_goals[valid] = home
+    away_goals[valid] = away
+    return home_goals, away_goals
 
 
 def kelly_criterion(probability, odds, bankroll, kelly_fraction=1.0):
@@ -169,19 +492,26 @@ def kelly_criterion(probability, odds, bankroll, kelly_fraction=1.0):
     Returns:
     - The optimal amount to bet from your bankroll, adjusted by the specified Kelly fraction.
     """
-    b = odds - 1  # Convert decimal odds to b in the formula
-    q = 1 - probability  # Probability of losing
+    return kelly_stake_fractions(probability, odds, kelly_fraction) * bankroll
 
-    # Calculate the fraction of the bankroll to bet, according to the Kelly Criterion
-    f_star = (b * probability - q) / b
 
-    # Adjust the fraction with the specified Kelly fraction
-    f_star = max(f_star, 0) * kelly_fraction
+def kelly_stake_fractions(probability, odds, kelly_fraction=1.0):
+    """
+    Vectorised Kelly Criterion: the fraction of the bankroll to stake on each bet.
 
-    # Calculate the amount to bet
-    bet_amount = f_star * bankroll
+    Parameters:
+    - probability: Array of probabilities of the outcomes occurring.
+    - odds: Array of decimal odds offered, broadcastable against probability.
+    - kelly_fraction: Fraction of the Kelly bet to use, scalar or array (e.g. a sweep).
 
-    return bet_amount
+    Returns:
+    - Array of bankroll fractions, 0 wherever there is no edge or no odds.
+    """
+    probability = np.asarray(probability, dtype=float)
+    b = np.asarray(odds, dtype=float) - 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f_star = (b * probability - (1 - probability)) / b
+    return np.nan_to_num(np.maximum(f_star, 0), nan=0.0, posinf=0.0) * kelly_fraction
 
 
 def calculate_overround(odds_list):
@@ -189,13 +519,7 @@ def calculate_overround(odds_list):
     This function calculates the overround from a list of odds.
     It will return a negative number if the sum of the implied probabilities of the odds is greater than one
     """
-    # Convert each odd in the list to implied probability
-    implied_probabilities = [1 / odd for odd in odds_list]
-    # Sum up all the implied probabilities
-    total_implied_probability = sum(implied_probabilities)
-    # Calculate overround
-    overround = (total_implied_probability - 1) * 100
-    return overround
+    return float(overround_batch(np.asarray(odds_list, dtype=float)[None, :])[0])
 
 
 def calculate_exchange_overround(odds_list, commission_rate):
@@ -203,50 +527,155 @@ def calculate_exchange_overround(odds_list, commission_rate):
     This function calculates the overround from a list of odds for an exchange, adding in the comission rate.
     The comission should be given as a decimal representation of the percentage (2% = 0.02 etc.)
     """
-    odds_minus_comission = []
-    for odd in odds_list:
-        profit = odd - 1
-        comm_profit = profit * (1 - commission_rate)
-        revised_odd = comm_profit + 1
-        odds_minus_comission.append(revised_odd)
-    # Convert each odd in the list to implied probability
-    implied_probabilities = [1 / odd for odd in odds_minus_comission]
-    # Sum up all the adjusted implied probabilities
-    total_adjusted_implied_probability = sum(implied_probabilities)
-    # Calculate overround with commission
-    overround = (total_adjusted_implied_probability - 1) * 100
-    return overround
+    return float(
+        overround_batch(np.asarray(odds_list, dtype=float)[None, :], commission_rate)[0]
+    )
 
 
 def find_true_probabilities_equal(odds):
-    # Convert odds to implied probabilities
-    probabilities = [1 / o for o in odds]
-    # Calculate the total implied probability
-    total_probability = sum(probabilities)
-    # Calculate the overround
-    overround = total_probability - 1
-    # Calculate the adjustment factor for each odd
-    adjustment_factor = overround / len(odds)
-    # Adjust each implied probability
-    adjusted_probabilities = [(1 / o) - adjustment_factor for o in odds]
-    return np.array(adjusted_probabilities)
+    return devig_equal(np.asarray(odds, dtype=float)[None, :])["probs"][0]
 
 
 def find_true_probabilities_power(odds):
-    # Convert odds to implied probabilities
-    probabilities = np.array([1 / o for o in odds])
-
-    # Define the objective function to minimize
-    def objective(k):
-        adj_probs = probabilities**k
-        return (1 - np.sum(adj_probs)) ** 2
-
-    # Initial guess for k
-    initial_k = [1.0]
-    # Bounds for k, ensuring k is not zero
-    bounds = [(0.001, None)]
-    # Minimize the objective function
-    result = minimize(objective, initial_k)
-    # Calculate the true probabilities using the optimized k
-    adjusted_true_probabilities = probabilities ** (result.x[0])
-    return adjusted_true_probabilities
+    return devig_power(np.asarray(odds, dtype=float)[None, :])["probs"][0]
+
+
+def overround_batch(odds, commission_rate=0.0):
+    """
+    Overround in percent of every row of an (N, k) odds matrix.
+
+    With a ``commission_rate`` (2% = 0.02) the odds are first cut to what an exchange
+    pays out after commission on winnings.
+    """
+    odds = np.asarray(odds, dtype=float)
+    odds = (odds - 1) * (1 - commission_rate) + 1
+    return (np.sum(1 / odds, axis=-1) - 1) * 100
+
+
+def _implied(odds):
+    implied = 1 / np.asarray(odds, dtype=float)
+    # a row missing any price has no fair probabilities at all
+    implied[np.any(np.isnan(implied), axis=-1)] = np.nan
+    return implied, np.sum(implied, axis=-1, keepdims=True)
+
+
+def _bisect_rows(total, lower, upper, iterations=60):
+    """
+    Solve ``total(x) == 1`` for every row at once, ``total`` decreasing in ``x``.
+
+    ``lower`` and ``upper`` are per-row brackets of shape (N, 1); returns the midpoints
+    after ``iterations`` halvings.
+    """
+    for _ in range(iterations):
+        middle = (lower + upper) / 2
+        too_high = total(middle) > 1
+        lower = np.where(too_high, middle, lower)
+        upper = np.where(too_high, upper, middle)
+    return (lower + upper) / 2
+
+
+def devig_equal(odds):
+    """
+    Remove the margin equally from every outcome's implied probability.
+
+    Takes an (N, k) odds matrix and returns a dict with the fair probabilities and each
+    row's margin (sum of implied probabilities minus one). This is the same as the
+    ``fair = k * odds / (k - margin * odds)`` odds used in the notebooks.
+    """
+    implied, total = _implied(odds)
+    margin = total - 1
+    return {"probs": implied - margin / implied.shape[-1], "margin": margin[..., 0]}
+
+
+def devig_proportional(odds):
+    """Scale every implied probability down by the same factor."""
+    implied, total = _implied(odds)
+    return {"probs": implied / total, "margin": total[..., 0] - 1}
+
+
+def devig_power(odds, tol=1e-12, max_iter=50):
+    """
+    Fair probabilities ``implied ** k`` with ``k`` chosen per row so they sum to one.
+
+    All rows are solved together by Newton's method on ``sum(implied ** k) - 1``, which
+    is convex and decreasing in ``k`` so the iterates converge monotonically from the
+    first step. Returns the probabilities, margins and exponents.
+    """
+    implied, total = _implied(odds)
+    log_implied = np.log(implied)
+    k = np.ones_like(total)
+    for _ in range(max_iter):
+        powered = implied**k
+        step = (np.sum(powered, axis=-1, keepdims=True) - 1) / np.sum(
+            powered * log_implied, axis=-1, keepdims=True
+        )
+        k = k - step
+        if not np.any(np.abs(step) > tol):
+            break
+    return {"probs": implied**k, "margin": total[..., 0] - 1, "k": k[..., 0]}
+
+
+def devig_shin(odds):
+    """
+    Shin's method: the margin comes from a share ``z`` of insider money.
+
+    ``p = (sqrt(z^2 + 4 (1 - z) implied^2 / total) - z) / (2 (1 - z))`` with ``z``
+    bisected per row so the probabilities sum to one. Returns the probabilities, margins
+    and ``z``.
+    """
+    implied, total = _implied(odds)
+
+    def shin_probs(z):
+        return (np.sqrt(z**2 + 4 * (1 - z) * implied**2 / total) - z) / (2 * (1 - z))
+
+    z = _bisect_rows(
+        lambda z: np.sum(shin_probs(z), axis=-1, keepdims=True),
+        np.zeros_like(total),
+        np.full_like(total, 0.999),
+    )
+    return {"probs": shin_probs(z), "margin": total[..., 0] - 1, "z": z[..., 0]}
+
+
+def devig_odds_ratio(odds):
+    """
+    Cheung's odds-ratio method: fair odds against each outcome are the implied odds
+    against it scaled by one constant ``c`` per row, found by bisection on ``log c``.
+    Returns the probabilities, margins and ``c``.
+    """
+    implied, total = _implied(odds)
+
+    def ratio_probs(log_c):
+        c = np.exp(log_c)
+        return implied / (c * (1 - implied) + implied)
+
+    log_c = _bisect_rows(
+        lambda log_c: np.sum(ratio_probs(log_c), axis=-1, keepdims=True),
+        np.full_like(total, -10.0),
+        np.full_like(total, 10.0),
+    )
+    return {
+        "probs": ratio_probs(log_c),
+        "margin": total[..., 0] - 1,
+        "c": np.exp(log_c[..., 0]),
+    }
+
+
+DEVIG_METHODS = {
+    "equal": devig_equal,
+    "proportional": devig_proportional,
+    "power": devig_power,
+    "shin": devig_shin,
+    "odds_ratio": devig_odds_ratio,
+}
+
+
+def remove_margin(odds, method="power"):
+    """
+    Fair probabilities for every row of an (N, k) odds matrix (or DataFrame of odds
+    columns) with one of ``DEVIG_METHODS``. Rows with missing odds come back as NaN.
+    """
+    if method not in DEVIG_METHODS:
+        raise ValueError(
+            "unknown method {}, expected one of {}".format(method, list(DEVIG_METHODS))
+        )
+    return DEVIG_METHODS[method](np.asarray(odds, dtype=float))
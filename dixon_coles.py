@@ -1,8 +1,25 @@
+from collections import OrderedDict
+
 import numpy as np
-from scipy.optimize import minimize
-from scipy.stats import poisson
+import pandas as pd
 
 from bettools import calculate_ev_from_odds, kelly_criterion
+from instrumentation import PhaseTimer, emit, enabled
+
+# scipy is imported inside the functions that use it (see import_budget.py)
+
+# smallest tau the likelihood will take the log of; keeps infeasible rho finite
+TAU_FLOOR = 1e-10
+
+# time decay used when no tuned value has been saved (see xi_search.tuned_xi)
+DEFAULT_XI = 0.00325
+
+# scipy.optimize options the solvers use when none are given
+DEFAULT_SOLVER_OPTIONS = {"disp": True, "maxiter": 100}
+
+# all-pairs fixture caches for the most recently used parameter sets, oldest first
+_FIXTURE_CACHES = OrderedDict()
+MAX_CACHED_PARAM_SETS = 8
 
 
 def rho_correction(x, y, lambda_x, mu_y, rho):
@@ -19,6 +36,8 @@ def rho_correction(x, y, lambda_x, mu_y, rho):
 
 
 def dc_log_like(x, y, alpha_x, beta_x, alpha_y, beta_y, rho, gamma):
+    from scipy.stats import poisson
+
     lambda_x, mu_y = np.exp(alpha_x + beta_y + gamma), np.exp(alpha_y + beta_x)
     return (
         np.log(rho_correction(x, y, lambda_x, mu_y, rho))
@@ -27,20 +46,397 @@ def dc_log_like(x, y, alpha_x, beta_x, alpha_y, beta_y, rho, gamma):
     )
 
 
-def solve_parameters(
-    dataset,
-    debug=False,
+def encode_teams(dataset, teams=None):
+    """
+    Integer-encode the home and away sides of a match frame.
+
+    Teams are coded against ``teams`` (sorted home teams by default), so the codes line up
+    with the order of the attack and defence blocks in the parameter vector.
+    Raises a KeyError if a side is missing from ``teams``.
+    """
+    if teams is None:
+        teams = np.sort(dataset["HomeTeam"].unique())
+    home_idx = pd.Categorical(dataset["HomeTeam"], categories=teams).codes
+    away_idx = pd.Categorical(dataset["AwayTeam"], categories=teams).codes
+    if (home_idx < 0).any() or (away_idx < 0).any():
+        missing = set(dataset["HomeTeam"][home_idx < 0]) | set(
+            dataset["AwayTeam"][away_idx < 0]
+        )
+        raise KeyError("Unknown teams: {}".format(sorted(missing)))
+    return teams, home_idx.astype(np.intp), away_idx.astype(np.intp)
+
+
+def prepare_match_arrays(home_idx, away_idx, home_goals, away_goals, weights=None):
+    """
+    Bundle the per-match arrays the vectorised likelihood needs.
+
+    Everything that does not depend on the model parameters (log factorials, low-score
+    masks, decay weights) is computed here once per fit rather than once per evaluation.
+    """
+    from scipy.special import gammaln
+
+    home_goals = np.asarray(home_goals, dtype=float)
+    away_goals = np.asarray(away_goals, dtype=float)
+    if weights is None:
+        weights = np.ones_like(home_goals)
+    return {
+        "home_idx": np.asarray(home_idx, dtype=np.intp),
+        "away_idx": np.asarray(away_idx, dtype=np.intp),
+        "home_goals": home_goals,
+        "away_goals": away_goals,
+        "weights": np.asarray(weights, dtype=float),
+        "log_factorial": gammaln(home_goals + 1) + gammaln(away_goals + 1),
+        "mask_00": (home_goals == 0) & (away_goals == 0),
+        "mask_01": (home_goals == 0) & (away_goals == 1),
+        "mask_10": (home_goals == 1) & (away_goals == 0),
+        "mask_11": (home_goals == 1) & (away_goals == 1),
+    }
+
+
+def decay_weights(time_diff, xi=0):
+    return np.exp(-xi * np.asarray(time_diff, dtype=float))
+
+
+def rho_correction_array(lambda_x, mu_y, rho, matches):
+    """Vectorised ``rho_correction`` over every match in ``matches``."""
+    tau = np.ones_like(lambda_x)
+    mask = matches["mask_00"]
+    tau[mask] = 1 - lambda_x[mask] * mu_y[mask] * rho
+    mask = matches["mask_01"]
+    tau[mask] = 1 + lambda_x[mask] * rho
+    mask = matches["mask_10"]
+    tau[mask] = 1 + mu_y[mask] * rho
+    tau[matches["mask_11"]] = 1 - rho
+    return tau
+
+
+def feasible_rho_range(lambda_x, mu_y, matches):
+    """
+    Interval of rho for which every tau correction in ``matches`` stays at or above
+    ``TAU_FLOOR`` given the current means.
+    """
+    margin = 1 - TAU_FLOOR
+    lower = max(
+        np.max(-margin / lambda_x[matches["mask_01"]], initial=-np.inf),
+        np.max(-margin / mu_y[matches["mask_10"]], initial=-np.inf),
+    )
+    upper = np.min(margin / (lambda_x * mu_y)[matches["mask_00"]], initial=np.inf)
+    if matches["mask_11"].any():
+        upper = min(upper, margin)
+    return lower, upper
+
+
+def _clip_rho(params, matches):
+    params = params.copy()
+    log_lambda_x, log_mu_y = _log_means(params, matches)
+    lower, upper = feasible_rho_range(np.exp(log_lambda_x), np.exp(log_mu_y), matches)
+    params[-2] = np.clip(params[-2], lower, upper)
+    return params
+
+
+def _floor_tau(tau, derivatives):
+    # where tau is floored the clamped log-likelihood is flat, so its derivatives vanish
+    floored = tau < TAU_FLOOR
+    for deriv in derivatives:
+        deriv[floored] = 0
+    return np.maximum(tau, TAU_FLOOR), derivatives
+
+
+def _log_means(params, matches):
+    n_teams = (len(params) - 2) // 2
+    attack, defence = params[:n_teams], params[n_teams : (2 * n_teams)]
+    gamma = params[-1]
+    home_idx, away_idx = matches["home_idx"], matches["away_idx"]
+    return (
+        attack[home_idx] + defence[away_idx] + gamma,
+        attack[away_idx] + defence[home_idx],
+    )
+
+
+def dc_negative_log_like(params, matches):
+    """
+    Negative (weighted) Dixon-Coles log-likelihood of ``matches`` under ``params``.
+
+    ``params`` is laid out as in the solvers: n attack values, n defence values, rho and
+    home advantage. Attack and defence are gathered by team index and the Poisson terms
+    are evaluated in log space, so the whole dataset is scored in a handful of array ops.
+    """
+    log_lambda_x, log_mu_y = _log_means(params, matches)
+    lambda_x, mu_y = np.exp(log_lambda_x), np.exp(log_mu_y)
+    rho = params[-2]
+    log_like = (
+        np.log(
+            np.maximum(rho_correction_array(lambda_x, mu_y, rho, matches), TAU_FLOOR)
+        )
+        + matches["home_goals"] * log_lambda_x
+        - lambda_x
+        + matches["away_goals"] * log_mu_y
+        - mu_y
+        - matches["log_factorial"]
+    )
+    return -np.sum(matches["weights"] * log_like)
+
+
+def _tau_derivatives(lambda_x, mu_y, rho, matches):
+    """
+    Derivatives of the tau correction with respect to u = log(lambda_x), v = log(mu_y)
+    and rho. Only the four low-score masks contribute; every other entry is zero.
+    Returns (tau_u, tau_v, tau_rho, tau_uu, tau_vv, tau_uv, tau_urho, tau_vrho), the
+    second rho derivative being identically zero.
+    """
+    tau_u, tau_v, tau_rho = (np.zeros_like(lambda_x) for _ in range(3))
+    tau_uu, tau_vv, tau_uv = (np.zeros_like(lambda_x) for _ in range(3))
+    tau_urho, tau_vrho = np.zeros_like(lambda_x), np.zeros_like(lambda_x)
+
+    mask = matches["mask_00"]
+    lambda_mu = lambda_x[mask] * mu_y[mask]
+    for deriv in (tau_u, tau_v, tau_uu, tau_vv, tau_uv):
+        deriv[mask] = -rho * lambda_mu
+    tau_rho[mask] = tau_urho[mask] = tau_vrho[mask] = -lambda_mu
+
+    mask = matches["mask_01"]
+    tau_u[mask] = tau_uu[mask] = rho * lambda_x[mask]
+    tau_rho[mask] = tau_urho[mask] = lambda_x[mask]
+
+    mask = matches["mask_10"]
+    tau_v[mask] = tau_vv[mask] = rho * mu_y[mask]
+    tau_rho[mask] = tau_vrho[mask] = mu_y[mask]
+
+    tau_rho[matches["mask_11"]] = -1
+    return tau_u, tau_v, tau_rho, tau_uu, tau_vv, tau_uv, tau_urho, tau_vrho
+
+
+def dc_gradient(params, matches):
+    """Exact gradient of ``dc_negative_log_like`` with respect to ``params``."""
+    n_teams = (len(params) - 2) // 2
+    rho = params[-2]
+    log_lambda_x, log_mu_y = _log_means(params, matches)
+    lambda_x, mu_y = np.exp(log_lambda_x), np.exp(log_mu_y)
+    tau, (tau_u, tau_v, tau_rho) = _floor_tau(
+        rho_correction_array(lambda_x, mu_y, rho, matches),
+        _tau_derivatives(lambda_x, mu_y, rho, matches)[:3],
+    )
+
+    weights = matches["weights"]
+    home_idx, away_idx = matches["home_idx"], matches["away_idx"]
+    # score with respect to the home and away log-means of each match
+    grad_u = weights * (matches["home_goals"] - lambda_x + tau_u / tau)
+    grad_v = weights * (matches["away_goals"] - mu_y + tau_v / tau)
+
+    grad = np.empty(len(params))
+    grad[:n_teams] = np.bincount(home_idx, grad_u, n_teams) + np.bincount(
+        away_idx, grad_v, n_teams
+    )
+    grad[n_teams : (2 * n_teams)] = np.bincount(
+        away_idx, grad_u, n_teams
+    ) + np.bincount(home_idx, grad_v, n_teams)
+    grad[-2] = np.sum(weights * tau_rho / tau)
+    grad[-1] = np.sum(grad_u)
+    return -grad
+
+
+def dc_hessian(params, matches):
+    """Exact Hessian of ``dc_negative_log_like`` with respect to ``params``."""
+    n_teams = (len(params) - 2) // 2
+    n_params = len(params)
+    rho = params[-2]
+    log_lambda_x, log_mu_y = _log_means(params, matches)
+    lambda_x, mu_y = np.exp(log_lambda_x), np.exp(log_mu_y)
+    tau, (
+        tau_u,
+        tau_v,
+        tau_rho,
+        tau_uu,
+        tau_vv,
+        tau_uv,
+        tau_urho,
+        tau_vrho,
+    ) = _floor_tau(
+        rho_correction_array(lambda_x, mu_y, rho, matches),
+        _tau_derivatives(lambda_x, mu_y, rho, matches),
+    )
+
+    weights = matches["weights"]
+    l_uu = weights * (-lambda_x + tau_uu / tau - (tau_u / tau) ** 2)
+    l_vv = weights * (-mu_y + tau_vv / tau - (tau_v / tau) ** 2)
+    l_uv = weights * (tau_uv / tau - tau_u * tau_v / tau**2)
+    l_urho = weights * (tau_urho / tau - tau_u * tau_rho / tau**2)
+    l_vrho = weights * (tau_vrho / tau - tau_v * tau_rho / tau**2)
+    l_rhorho = weights * -((tau_rho / tau) ** 2)
+
+    # design matrices mapping params onto each match's home and away log-means
+    rows = np.arange(len(lambda_x))
+    home_idx, away_idx = matches["home_idx"], matches["away_idx"]
+    design_u = np.zeros((len(lambda_x), n_params))
+    design_u[rows, home_idx] = 1
+    design_u[rows, n_teams + away_idx] = 1
+    design_u[:, -1] = 1
+    design_v = np.zeros((len(lambda_x), n_params))
+    design_v[rows, away_idx] = 1
+    design_v[rows, n_teams + home_idx] = 1
+
+    cross = design_u.T @ (l_uv[:, None] * design_v)
+    hess = (
+        design_u.T @ (l_uu[:, None] * design_u)
+        + design_v.T @ (l_vv[:, None] * design_v)
+        + cross
+        + cross.T
+    )
+    rho_col = design_u.T @ l_urho + design_v.T @ l_vrho
+    hess[:, -2] += rho_col
+    hess[-2, :] += rho_col
+    hess[-2, -2] += np.sum(l_rhorho)
+    return -hess
+
+
+def parameter_standard_errors(dataset, params, xi=0):
+    """
+    Standard errors for a fitted parameter dict, from the Hessian at the optimum.
+
+    The likelihood only identifies attack and defence up to a common shift, so the
+    covariance is taken in the subspace that keeps the sum of the attack parameters
+    fixed (the solvers' identifiability constraint). ``xi`` should match the decay used
+    for the fit; ``dataset`` needs a ``time_diff`` column when it is non-zero.
+    """
+    from scipy.linalg import null_space
+
+    teams, attack, defence, rho, home_adv = params_to_arrays(params)
+    n_teams = len(teams)
+    x = np.concatenate((attack, defence, [rho, home_adv]))
+    _, home_idx, away_idx = encode_teams(dataset, teams)
+    weights = None
+    if xi:
+        weights = decay_weights(dataset["time_diff"].to_numpy(), xi)
+    matches = prepare_match_arrays(
+        home_idx,
+        away_idx,
+        dataset["FTHG"].to_numpy(),
+        dataset["FTAG"].to_numpy(),
+        weights=weights,
+    )
+    hess = dc_hessian(x, matches)
+
+    constraint = np.zeros(len(x))
+    constraint[:n_teams] = 1
+    basis = null_space(constraint[None, :])
+    covariance = basis @ np.linalg.inv(basis.T @ hess @ basis) @ basis.T
+    return dict(
+        zip(
+            ["attack_" + team for team in teams]
+            + ["defence_" + team for team in teams]
+            + ["rho", "home_adv"],
+            np.sqrt(np.diag(covariance)),
+        )
+    )
+
+
+def params_to_dict(teams, params):
+    return dict(
+        zip(
+            ["attack_" + team for team in teams]
+            + ["defence_" + team for team in teams]
+            + ["rho", "home_adv"],
+            params,
+        )
+    )
+
+
+def params_to_arrays(params):
+    """
+    Inverse of ``params_to_dict``: sorted team names, attack and defence arrays aligned
+    with them, rho and home advantage.
+    """
+    teams = np.array(
+        sorted(key[len("attack_") :] for key in params if key.startswith("attack_"))
+    )
+    attack = np.array([params["attack_" + team] for team in teams])
+    defence = np.array([params["defence_" + team] for team in teams])
+    return teams, attack, defence, params["rho"], params["home_adv"]
+
+
+def _to_free_params(params, n_teams):
+    # shift attack to sum to zero (defence absorbs the shift, means are unchanged),
+    # drop the last attack value and map rho onto the real line
+    shift = np.mean(params[:n_teams])
+    return np.concatenate(
+        (
+            params[: n_teams - 1] - shift,
+            params[n_teams : (2 * n_teams)] + shift,
+            [np.arctanh(np.clip(params[-2], -0.99, 0.99)), params[-1]],
+        )
+    )
+
+
+def _from_free_params(free, n_teams):
+    attack = free[: n_teams - 1]
+    return np.concatenate(
+        (
+            attack,
+            [-np.sum(attack)],
+            free[(n_teams - 1) : (2 * n_teams - 1)],
+            [np.tanh(free[-2]), free[-1]],
+        )
+    )
+
+
+def _free_negative_log_like(free, matches, n_teams):
+    return dc_negative_log_like(_from_free_params(free, n_teams), matches)
+
+
+def _free_gradient(free, matches, n_teams):
+    grad = dc_gradient(_from_free_params(free, n_teams), matches)
+    return np.concatenate(
+        (
+            grad[: n_teams - 1] - grad[n_teams - 1],
+            grad[n_teams : (2 * n_teams)],
+            [grad[-2] * (1 - np.tanh(free[-2]) ** 2), grad[-1]],
+        )
+    )
+
+
+def _free_hessian(free, matches, n_teams):
+    full = _from_free_params(free, n_teams)
+    # Jacobian of the full parameter vector with respect to the free one
+    jacobian = np.zeros((2 * n_teams + 2, 2 * n_teams + 1))
+    jacobian[: n_teams - 1, : n_teams - 1] = np.eye(n_teams - 1)
+    jacobian[n_teams - 1, : n_teams - 1] = -1
+    jacobian[n_teams : (2 * n_teams), (n_teams - 1) : (2 * n_teams - 1)] = np.eye(
+        n_teams
+    )
+    tanh_rho = np.tanh(free[-2])
+    jacobian[-2, -2] = 1 - tanh_rho**2
+    jacobian[-1, -1] = 1
+    hess = jacobian.T @ dc_hessian(full, matches) @ jacobian
+    hess[-2, -2] += dc_gradient(full, matches)[-2] * -2 * tanh_rho * (1 - tanh_rho**2)
+    return hess
+
+
+def solve_parameters_arrays(
+    matches,
+    n_teams,
     init_vals=None,
-    options={"disp": True, "maxiter": 100},
-    constraints=[{"type": "eq", "fun": lambda x: sum(x[:20]) - 20}],
+    options=None,
+    constraints=None,
+    analytic_gradient=False,
+    reparameterise=False,
     **kwargs
 ):
-    teams = np.sort(dataset["HomeTeam"].unique())
-    # check for no weirdness in dataset
-    away_teams = np.sort(dataset["AwayTeam"].unique())
-    if not np.array_equal(teams, away_teams):
-        raise ValueError("Something's not right")
-    n_teams = len(teams)
+    """
+    Fit Dixon-Coles parameters to ``prepare_match_arrays`` output for ``n_teams`` teams.
+
+    By default this is the constrained SLSQP fit, with the attack parameters summing to
+    ``n_teams``. With ``reparameterise=True`` the problem is made unconstrained instead:
+    n-1 free attack values (the last is minus their sum, so attack sums to zero), rho as
+    tanh of a free value so it stays in (-1, 1), minimised with L-BFGS-B and the analytic
+    gradient. Passing a Hessian-based ``method`` such as "trust-exact" uses the analytic
+    Hessian too, which converges in a few steps from a good (warm) start. Either way
+    the returned OptimizeResult's ``x`` is in the usual attack/defence/rho/home_adv
+    layout, with rho clipped to the range that keeps every tau correction positive,
+    and ``grad_norm`` holds the final gradient norm.
+    """
+    from scipy.optimize import minimize
+
+    options = dict(DEFAULT_SOLVER_OPTIONS if options is None else options)
     if init_vals is None:
         # random initialisation of model parameters
         init_vals = np.concatenate(
@@ -50,53 +446,127 @@ def solve_parameters(
                 np.array([0, 1.0]),  # rho (score correction), gamma (home advantage)
             )
         )
+    init_vals = _clip_rho(np.asarray(init_vals, dtype=float), matches)
 
-    def dc_log_like(x, y, alpha_x, beta_x, alpha_y, beta_y, rho, gamma):
-        lambda_x, mu_y = np.exp(alpha_x + beta_y + gamma), np.exp(alpha_y + beta_x)
-        return (
-            np.log(rho_correction(x, y, lambda_x, mu_y, rho))
-            + np.log(poisson.pmf(x, lambda_x))
-            + np.log(poisson.pmf(y, mu_y))
+    if reparameterise:
+        kwargs.setdefault("method", "L-BFGS-B")
+        if kwargs["method"] in (
+            "trust-exact",
+            "trust-ncg",
+            "trust-krylov",
+            "Newton-CG",
+        ):
+            kwargs.setdefault("hess", _free_hessian)
+        if kwargs["method"] == "L-BFGS-B":
+            # scipy deprecates disp (and iprint) for L-BFGS-B
+            options.pop("disp", None)
+            options.pop("iprint", None)
+        opt_output = minimize(
+            _free_negative_log_like,
+            _to_free_params(init_vals, n_teams),
+            args=(matches, n_teams),
+            jac=_free_gradient,
+            options=options,
+            **kwargs
+        )
+        opt_output.x = _from_free_params(opt_output.x, n_teams)
+    else:
+        if constraints is None:
+            constraints = [{"type": "eq", "fun": lambda x: sum(x[:n_teams]) - n_teams}]
+        if analytic_gradient:
+            # exact gradient instead of finite differences, one likelihood pass per step
+            kwargs["jac"] = dc_gradient
+        opt_output = minimize(
+            dc_negative_log_like,
+            init_vals,
+            args=(matches,),
+            options=options,
+            constraints=constraints,
+            **kwargs
         )
+    opt_output.x = _clip_rho(opt_output.x, matches)
+    opt_output.grad_norm = np.linalg.norm(dc_gradient(opt_output.x, matches))
+    # minimize picks SLSQP for the constrained problem when no method is given
+    opt_output.method = kwargs.get("method", "SLSQP")
+    return opt_output
+
+
+def fit_diagnostics(opt_output):
+    """
+    Summary of a ``solve_parameters_arrays`` result, for logging or filtering fits.
+
+    ``nfev``, ``njev`` and ``nhev`` count likelihood, gradient and Hessian evaluations
+    (finite-difference gradients show up as likelihood evaluations).
+    """
+    return {
+        "converged": bool(opt_output.success) and bool(np.isfinite(opt_output.fun)),
+        "iterations": int(opt_output.get("nit", 0)),
+        "grad_norm": float(opt_output.grad_norm),
+        "fun": float(opt_output.fun),
+        "nfev": int(opt_output.get("nfev", 0)),
+        "njev": int(opt_output.get("njev", 0)),
+        "nhev": int(opt_output.get("nhev", 0)),
+        "method": str(opt_output.get("method", "")),
+        "status": int(opt_output.get("status", 0)),
+        "message": str(opt_output.message),
+    }
+
+
+def emit_fit(event, opt_output, matches, n_teams, timer, **fields):
+    """
+    Send one fit's ``fit_diagnostics``, size and phase timings (from a ``PhaseTimer``)
+    to the instrumentation sink; a no-op when instrumentation is off.
+    """
+    if not enabled():
+        return
+    emit(
+        event,
+        n_matches=len(matches["home_goals"]),
+        n_teams=n_teams,
+        seconds=timer.total(),
+        **timer.seconds,
+        **fit_diagnostics(opt_output),
+        **fields
+    )
 
-    def estimate_paramters(params):
-        score_coefs = dict(zip(teams, params[:n_teams]))
-        defend_coefs = dict(zip(teams, params[n_teams : (2 * n_teams)]))
-        rho, gamma = params[-2:]
-        log_like = [
-            dc_log_like(
-                row.FTHG,
-                row.FTAG,
-                score_coefs[row.HomeTeam],
-                defend_coefs[row.HomeTeam],
-                score_coefs[row.AwayTeam],
-                defend_coefs[row.AwayTeam],
-                rho,
-                gamma,
-            )
-            for row in dataset.itertuples()
-        ]
-        return -sum(log_like)
 
-    opt_output = minimize(
-        estimate_paramters,
-        init_vals,
+def solve_parameters(
+    dataset,
+    debug=False,
+    init_vals=None,
+    options=None,
+    constraints=None,
+    analytic_gradient=False,
+    reparameterise=False,
+    diagnostics=False,
+    **kwargs
+):
+    teams = np.sort(dataset["HomeTeam"].unique())
+    # check for no weirdness in dataset
+    away_teams = np.sort(dataset["AwayTeam"].unique())
+    if not np.array_equal(teams, away_teams):
+        raise ValueError("Something's not right")
+    _, home_idx, away_idx = encode_teams(dataset, teams)
+    matches = prepare_match_arrays(
+        home_idx, away_idx, dataset["FTHG"].to_numpy(), dataset["FTAG"].to_numpy()
+    )
+    opt_output = solve_parameters_arrays(
+        matches,
+        len(teams),
+        init_vals=init_vals,
         options=options,
         constraints=constraints,
+        analytic_gradient=analytic_gradient,
+        reparameterise=reparameterise,
         **kwargs
     )
     if debug:
         # sort of hacky way to investigate the output of the optimisation process
         return opt_output
+    elif diagnostics:
+        return params_to_dict(teams, opt_output.x), fit_diagnostics(opt_output)
     else:
-        return dict(
-            zip(
-                ["attack_" + team for team in teams]
-                + ["defence_" + team for team in teams]
-                + ["rho", "home_adv"],
-                opt_output.x,
-            )
-        )
+        return params_to_dict(teams, opt_output.x)
 
 
 def calc_means(param_dict, homeTeam, awayTeam):
@@ -111,6 +581,8 @@ def calc_means(param_dict, homeTeam, awayTeam):
 
 
 def dixon_coles_simulate_match(params_dict, homeTeam, awayTeam, max_goals=10):
+    from scipy.stats import poisson
+
     team_avgs = calc_means(params_dict, homeTeam, awayTeam)
     team_pred = [
         [poisson.pmf(i, team_avg) for i in range(0, max_goals + 1)]
@@ -137,6 +609,8 @@ def dixon_coles_simulate_match(params_dict, homeTeam, awayTeam, max_goals=10):
 
 
 def dc_log_like_decay(x, y, alpha_x, beta_x, alpha_y, beta_y, rho, gamma, t, xi=0):
+    from scipy.stats import poisson
+
     lambda_x, mu_y = np.exp(alpha_x + beta_y + gamma), np.exp(alpha_y + beta_x)
     return np.exp(-xi * t) * (
         np.log(rho_correction(x, y, lambda_x, mu_y, rho))
@@ -150,70 +624,51 @@ def solve_parameters_decay(
     xi=0.001,
     debug=False,
     init_vals=None,
-    options={"disp": True, "maxiter": 100},
-    constraints=[{"type": "eq", "fun": lambda x: sum(x[:20]) - 20}],
+    options=None,
+    constraints=None,
+    analytic_gradient=False,
+    reparameterise=False,
+    diagnostics=False,
+    check_teams=True,
     **kwargs
 ):
+    timer = PhaseTimer()
     teams = np.sort(dataset["HomeTeam"].unique())
-    # check for no weirdness in dataset
     away_teams = np.sort(dataset["AwayTeam"].unique())
-    if not np.array_equal(teams, away_teams):
+    if not check_teams:
+        # walk-forward windows can cut a team's history down to only home or away games
+        teams = np.union1d(teams, away_teams)
+    elif not np.array_equal(teams, away_teams):
+        # check for no weirdness in dataset
         raise ValueError("something not right")
-    n_teams = len(teams)
-    if init_vals is None:
-        # random initialisation of model parameters
-        init_vals = np.concatenate(
-            (
-                np.random.uniform(0, 1, (n_teams)),  # attack strength
-                np.random.uniform(0, -1, (n_teams)),  # defence strength
-                np.array([0, 1.0]),  # rho (score correction), gamma (home advantage)
-            )
-        )
-
-    def dc_log_like_decay(x, y, alpha_x, beta_x, alpha_y, beta_y, rho, gamma, t, xi=xi):
-        lambda_x, mu_y = np.exp(alpha_x + beta_y + gamma), np.exp(alpha_y + beta_x)
-        return np.exp(-xi * t) * (
-            np.log(rho_correction(x, y, lambda_x, mu_y, rho))
-            + np.log(poisson.pmf(x, lambda_x))
-            + np.log(poisson.pmf(y, mu_y))
-        )
-
-    def estimate_paramters(params):
-        score_coefs = dict(zip(teams, params[:n_teams]))
-        defend_coefs = dict(zip(teams, params[n_teams : (2 * n_teams)]))
-        rho, gamma = params[-2:]
-        log_like = [
-            dc_log_like_decay(
-                row.FTHG,
-                row.FTAG,
-                score_coefs[row.HomeTeam],
-                defend_coefs[row.HomeTeam],
-                score_coefs[row.AwayTeam],
-                defend_coefs[row.AwayTeam],
-                rho,
-                gamma,
-                row.time_diff,
-                xi=xi,
-            )
-            for row in dataset.itertuples()
-        ]
-        return -sum(log_like)
-
-    opt_output = minimize(
-        estimate_paramters, init_vals, options=options, constraints=constraints
+    _, home_idx, away_idx = encode_teams(dataset, teams)
+    matches = prepare_match_arrays(
+        home_idx,
+        away_idx,
+        dataset["FTHG"].to_numpy(),
+        dataset["FTAG"].to_numpy(),
+        weights=decay_weights(dataset["time_diff"].to_numpy(), xi),
+    )
+    timer.lap("prepare")
+    opt_output = solve_parameters_arrays(
+        matches,
+        len(teams),
+        init_vals=init_vals,
+        options=options,
+        constraints=constraints,
+        analytic_gradient=analytic_gradient,
+        reparameterise=reparameterise,
+        **kwargs
     )
+    timer.lap("optimise")
+    emit_fit("fit", opt_output, matches, len(teams), timer, xi=xi)
     if debug:
         # sort of hacky way to investigate the output of the optimisation process
         return opt_output
+    elif diagnostics:
+        return params_to_dict(teams, opt_output.x), fit_diagnostics(opt_output)
     else:
-        return dict(
-            zip(
-                ["attack_" + team for team in teams]
-                + ["defence_" + team for team in teams]
-                + ["rho", "home_adv"],
-                opt_output.x,
-            )
-        )
+        return params_to_dict(teams, opt_output.x)
 
 
 def get_1x2_probs(match_score_matrix):
@@ -226,7 +681,124 @@ def get_1x2_probs(match_score_matrix):
     )
 
 
+def poisson_pmf_matrix(means, max_goals=10):
+    """(N, max_goals + 1) Poisson probabilities of 0..max_goals goals for each mean."""
+    from scipy.special import gammaln
+
+    goals = np.arange(max_goals + 1)
+    means = np.asarray(means, dtype=float)[:, None]
+    return np.exp(goals * np.log(means) - means - gammaln(goals + 1))
+
+
+def dixon_coles_simulate_matches(
+    attack, defence, rho, home_adv, home_idx, away_idx, max_goals=10
+):
+    """
+    Batched ``dixon_coles_simulate_match``.
+
+    Takes attack and defence arrays (as from ``params_to_arrays``) and arrays of home and
+    away team indices into them, and returns an (N, max_goals + 1, max_goals + 1) tensor
+    of score probabilities, home goals along axis 1 and away goals along axis 2.
+    """
+    home_idx, away_idx = np.asarray(home_idx), np.asarray(away_idx)
+    lambda_x = np.exp(attack[home_idx] + defence[away_idx] + home_adv)
+    mu_y = np.exp(defence[home_idx] + attack[away_idx])
+    output = (
+        poisson_pmf_matrix(lambda_x, max_goals)[:, :, None]
+        * poisson_pmf_matrix(mu_y, max_goals)[:, None, :]
+    )
+    output[:, 0, 0] *= 1 - lambda_x * mu_y * rho
+    output[:, 0, 1] *= 1 + lambda_x * rho
+    output[:, 1, 0] *= 1 + mu_y * rho
+    output[:, 1, 1] *= 1 - rho
+    return output
+
+
+def get_1x2_probs_batch(match_score_matrices):
+    """Batched ``get_1x2_probs``: the same keys, each holding one value per matrix."""
+    n_goals = match_score_matrices.shape[-1]
+    home_goals, away_goals = np.indices((n_goals, n_goals))
+    return {
+        "H": np.sum(match_score_matrices * (home_goals > away_goals), axis=(-2, -1)),
+        "A": np.sum(match_score_matrices * (home_goals < away_goals), axis=(-2, -1)),
+        "D": np.trace(match_score_matrices, axis1=-2, axis2=-1),
+    }
+
+
+def predict_1x2_probs(params, dataset, max_goals=10):
+    """
+    1X2 probabilities for every fixture in ``dataset`` (HomeTeam/AwayTeam columns) under
+    a fitted parameter dict, in one vectorised call.
+    """
+    teams, attack, defence, rho, home_adv = params_to_arrays(params)
+    _, home_idx, away_idx = encode_teams(dataset, teams)
+    return get_1x2_probs_batch(
+        dixon_coles_simulate_matches(
+            attack, defence, rho, home_adv, home_idx, away_idx, max_goals=max_goals
+        )
+    )
+
+
+def _params_key(params, max_goals):
+    return (tuple(sorted(params.items())), max_goals)
+
+
+def build_fixture_cache(params, max_goals=10):
+    """
+    Score matrices for every ordered pair of teams in a fitted parameter dict.
+
+    The matrices are stored as float32 in an (n_teams, n_teams, G+1, G+1) array indexed
+    [home, away], which for a 24-team league is well under a megabyte.
+    """
+    teams, attack, defence, rho, home_adv = params_to_arrays(params)
+    n_teams = len(teams)
+    home_idx, away_idx = np.divmod(np.arange(n_teams * n_teams), n_teams)
+    matrices = dixon_coles_simulate_matches(
+        attack, defence, rho, home_adv, home_idx, away_idx, max_goals=max_goals
+    )
+    return {
+        "teams": teams,
+        "team_index": {team: i for i, team in enumerate(teams)},
+        "matrices": matrices.astype(np.float32).reshape(
+            n_teams, n_teams, max_goals + 1, max_goals + 1
+        ),
+    }
+
+
+def get_fixture_cache(params, max_goals=10):
+    """
+    Cached ``build_fixture_cache``. The cache is keyed on the parameter values, so a refit
+    (or any edit to ``params``) builds a fresh one rather than serving stale prices.
+    """
+    key = _params_key(params, max_goals)
+    if key in _FIXTURE_CACHES:
+        _FIXTURE_CACHES.move_to_end(key)
+        return _FIXTURE_CACHES[key]
+    cache = build_fixture_cache(params, max_goals=max_goals)
+    _FIXTURE_CACHES[key] = cache
+    if len(_FIXTURE_CACHES) > MAX_CACHED_PARAM_SETS:
+        _FIXTURE_CACHES.popitem(last=False)
+    return cache
+
+
+def clear_fixture_caches():
+    _FIXTURE_CACHES.clear()
+
+
+def lookup_matrices(cache, home_teams, away_teams):
+    """(N, G+1, G+1) score matrices for the given fixtures, straight from the cache."""
+    team_index = cache["team_index"]
+    home_idx = np.array([team_index[team] for team in home_teams], dtype=np.intp)
+    away_idx = np.array([team_index[team] for team in away_teams], dtype=np.intp)
+    return cache["matrices"][home_idx, away_idx].astype(float)
+
+
 def build_temp_model(dataset, time_diff, xi=0.000, init_params=None):
+    """
+    Cold-start fit on the matches more than ``time_diff`` days old, scored by the
+    log-probability of the results in the 3 days after. ``xi_search`` does the same
+    for many cutoffs with warm starts.
+    """
     test_dataset = dataset[
         (
             (dataset["time_diff"] <= time_diff)
@@ -235,26 +807,29 @@ def build_temp_model(dataset, time_diff, xi=0.000, init_params=None):
     ]
     if len(test_dataset) == 0:
         return 0
-    train_dataset = dataset[dataset["time_diff"] > time_diff]
+    train_dataset = dataset[dataset["time_diff"] > time_diff].copy()
     train_dataset["time_diff"] = train_dataset["time_diff"] - time_diff
-    params = solve_parameters_decay(train_dataset, xi=xi, init_vals=init_params)
-    predictive_score = sum(
-        [
-            np.log(
-                get_1x2_probs(
-                    dixon_coles_simulate_match(params, row.HomeTeam, row.AwayTeam)
-                )[row.FTR]
-            )
-            for row in test_dataset.itertuples()
-        ]
+    params = solve_parameters_decay(
+        train_dataset,
+        xi=xi,
+        init_vals=init_params,
+        options={"maxiter": 200},
+        reparameterise=True,
     )
-    return predictive_score
+    probs = predict_1x2_probs(params, test_dataset)
+    actual = np.choose(
+        test_dataset["FTR"].map({"H": 0, "D": 1, "A": 2}).to_numpy(),
+        [probs["H"], probs["D"], probs["A"]],
+    )
+    return np.sum(np.log(actual))
+
 
+def get_total_score_xi(xi, dataset):
+    """Predictive score of ``xi`` at each of the standard cutoffs, most distant first."""
+    from xi_search import DEFAULT_CUTOFFS, prepare_xi_data, score_cutoffs
 
-def get_total_score_xi(xi):
-    xi_result = [build_temp_model(dc_df, day, xi=xi) for day in range(99, -1, -3)]
-    with open("find_xi_1season_{}.txt".format(str(xi)[2:]), "wb") as thefile:
-        pickle.dump(xi_result, thefile)
+    scores = score_cutoffs(prepare_xi_data(dataset), xi, DEFAULT_CUTOFFS)
+    return [scores[cutoff]["score"] for cutoff in DEFAULT_CUTOFFS]
 
 
 def make_betting_prediction(
@@ -267,6 +842,8 @@ def make_betting_prediction(
     bankroll,
     kelly_fraction=0.05,
 ):
+    # computed directly in float64: the float32 fixture cache would round the
+    # probabilities, and hashing params on every call costs more than this one match
     predicted_probs = get_1x2_probs(
         dixon_coles_simulate_match(params, home_team, away_team, max_goals=10)
     )
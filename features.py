@@ -0,0 +1,266 @@
+import numpy as np
+import pandas as pd
+
+# stat name -> (home column, away column) in get_data output
+DEFAULT_STATS = {
+    "Goals": ("FTHG", "FTAG"),
+    "Shots": ("HS", "AS"),
+    "Corners": ("HC", "AC"),
+}
+KEY_COLUMNS = ["Date", "HomeTeam", "AwayTeam"]
+
+
+def feature_names(stats, windows, alphas):
+    """Column names in the order ``team_features`` lays them out."""
+    names = ["{}_mean_{}".format(stat, window) for window in windows for stat in stats]
+    names += ["{}_ewm_{:g}".format(stat, alpha) for alpha in alphas for stat in stats]
+    return names + ["played"]
+
+
+def empty_state(n_teams, n_stats, windows, alphas):
+    """Running state for teams with no history: nothing played, no values yet."""
+    return {
+        "tail": np.full((n_teams, max(windows, default=1), n_stats), np.nan),
+        "weighted": np.zeros((len(alphas), n_teams, n_stats)),
+        "weights": np.zeros((len(alphas), n_teams, n_stats)),
+        "played": np.zeros(n_teams, dtype=np.int64),
+    }
+
+
+def _grow_state(state, n_teams, windows, alphas):
+    extra = n_teams - len(state["played"])
+    if extra <= 0:
+        return state
+    fresh = empty_state(extra, state["tail"].shape[2], windows, alphas)
+    return {
+        "tail": np.concatenate((state["tail"], fresh["tail"])),
+        "weighted": np.concatenate((state["weighted"], fresh["weighted"]), axis=1),
+        "weights": np.concatenate((state["weights"], fresh["weights"]), axis=1),
+        "played": np.concatenate((state["played"], fresh["played"])),
+    }
+
+
+def team_features(team_codes, values, windows, alphas, min_periods=None, state=None):
+    """
+    Rolling means, EWMAs and appearance counts after each team appearance.
+
+    ``team_codes`` (M,) and ``values`` (M, stats) are appearances in date order, with
+    NaN for missing stats. Every team's appearances are laid out side by side in a
+    (teams, appearances, stats) array behind the last ``max(windows)`` values from
+    ``state``, so each window's means are differences of one cumulative sum along the
+    appearance axis and the EWMAs one recursion over it, for all teams and stats at
+    once. Means match ``rolling(window, min_periods).mean()`` and EWMAs
+    ``ewm(alpha=alpha).mean()`` per team (``min_periods`` defaults to the window).
+    Returns the (M, features) array, in ``feature_names`` order, and the state to pass
+    to the next call.
+    """
+    values = np.asarray(values, dtype=float)
+    n_stats = values.shape[1]
+    n_teams = int(team_codes.max()) + 1 if len(team_codes) else 0
+    if state is None:
+        state = empty_state(n_teams, n_stats, windows, alphas)
+    state = _grow_state(state, n_teams, windows, alphas)
+    n_teams, history = len(state["played"]), state["tail"].shape[1]
+
+    order = np.lexsort((np.arange(len(team_codes)), team_codes))
+    counts = np.bincount(team_codes, minlength=n_teams)
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    position = np.empty(len(team_codes), dtype=np.int64)
+    position[order] = np.arange(len(team_codes)) - starts[team_codes[order]]
+
+    laid_out = np.full((n_teams, history + counts.max(initial=0), n_stats), np.nan)
+    laid_out[:, :history] = state["tail"]
+    laid_out[team_codes, history + position] = values
+    present = ~np.isnan(laid_out)
+    totals = np.zeros((n_teams, laid_out.shape[1] + 1, n_stats))
+    np.cumsum(np.where(present, laid_out, 0.0), axis=1, out=totals[:, 1:])
+    observed = np.zeros(totals.shape, dtype=np.int64)
+    np.cumsum(present, axis=1, out=observed[:, 1:])
+
+    columns = []
+    end = history + position + 1
+    for window in windows:
+        needed = window if min_periods is None else min_periods
+        total = totals[team_codes, end] - totals[team_codes, end - window]
+        count = observed[team_codes, end] - observed[team_codes, end - window]
+        columns.append(
+            np.where(count >= max(needed, 1), total / np.maximum(count, 1), np.nan)
+        )
+
+    weighted, weights = state["weighted"].copy(), state["weights"].copy()
+    smoothed = np.empty((len(alphas), len(team_codes), n_stats))
+    appeared = np.arange(counts.max(initial=0)) < counts[:, None]
+    decay = (1 - np.asarray(alphas, dtype=float))[:, None, None]
+    for step in range(counts.max(initial=0)):
+        rows = appeared[:, step]
+        new = laid_out[rows, history + step]
+        seen = ~np.isnan(new)
+        # as pandas' ewm(adjust=True): older values keep decaying through missing ones
+        weighted[:, rows] = decay * weighted[:, rows] + np.where(seen, new, 0.0)
+        weights[:, rows] = decay * weights[:, rows] + seen
+        emitted = order[starts[rows] + step]
+        # 0/0 for teams with nothing seen yet, masked to NaN below
+        with np.errstate(invalid="ignore", divide="ignore"):
+            smoothed[:, emitted] = np.where(
+                weights[:, rows] > 0, weighted[:, rows] / weights[:, rows], np.nan
+            )
+    columns.extend(smoothed)
+
+    played = state["played"] + counts
+    columns.append((state["played"][team_codes] + position + 1)[:, None])
+    new_state = {
+        "tail": laid_out[
+            np.arange(n_teams)[:, None],
+            counts[:, None] + np.arange(history),
+        ],
+        "weighted": weighted,
+        "weights": weights,
+        "played": played,
+    }
+    return np.concatenate(columns, axis=1), new_state
+
+
+def team_appearances(matches, stats):
+    """Each match twice, once per team, with that team's stats under the stat names."""
+    sides = []
+    for side, team_column, position in (
+        ("home", "HomeTeam", 0),
+        ("away", "AwayTeam", 1),
+    ):
+        frame = pd.DataFrame(
+            {
+                "Date": matches["Date"].to_numpy(),
+                "Team": matches[team_column].to_numpy(),
+                "Side": side,
+            }
+        )
+        for stat, columns in stats.items():
+            frame[stat] = matches[columns[position]].to_numpy(dtype=float)
+        sides.append(frame)
+    return pd.concat(sides, ignore_index=True)
+
+
+class FeatureStore:
+    """
+    Per-team rolling features over a match history, kept up to date as results arrive.
+
+    Every (team, appearance) gets its features *after* that match for every stat,
+    window and EWMA alpha in one call to ``team_features``. ``append`` adds later
+    matchdays by carrying each team's recent values and EWMA sums forward, so history
+    is never recomputed, and ``match_features`` joins each fixture to both teams' latest
+    features from strictly earlier dates, so there is no lookahead.
+    """
+
+    def __init__(
+        self,
+        stats=DEFAULT_STATS,
+        windows=(5, 10, 25),
+        alphas=(0.1,),
+        min_periods=None,
+    ):
+        self.stats = dict(stats)
+        self.windows = tuple(windows)
+        self.alphas = tuple(alphas)
+        self.min_periods = min_periods
+        self.columns = feature_names(self.stats, self.windows, self.alphas)
+        self.team_index = {}
+        self.state = None
+        self.appearances = pd.DataFrame(
+            columns=["Date", "Team", "Side"] + list(self.stats) + self.columns
+        )
+        self.keys = pd.MultiIndex.from_tuples([], names=KEY_COLUMNS)
+
+    def _codes(self, teams):
+        for team in teams:
+            if team not in self.team_index:
+                self.team_index[team] = len(self.team_index)
+        return np.array([self.team_index[team] for team in teams], dtype=np.int64)
+
+    def append(self, matches):
+        """
+        Add matches played after everything already stored.
+
+        Matches already in the store (same date and teams) are skipped, so the current
+        season's file can be passed in again as it grows. A new match dated on or before
+        either team's latest stored match raises ValueError, as it would change
+        features already handed out; build a new store for that.
+        """
+        matches = matches.dropna(subset=["FTHG", "FTAG"])
+        matches = matches[
+            ~pd.MultiIndex.from_frame(matches[KEY_COLUMNS]).isin(self.keys)
+        ].sort_values("Date", kind="mergesort")
+        if not len(matches):
+            return self
+        new = team_appearances(matches, self.stats)
+        if len(self.appearances):
+            last_dates = self.appearances.groupby("Team")["Date"].max()
+            if (new["Date"] <= new["Team"].map(last_dates)).any():
+                raise ValueError(
+                    "matches must be later than each team's stored history"
+                )
+
+        # date order, and for two matches on one day the order they were given in
+        new = new.iloc[
+            np.lexsort((np.tile(np.arange(len(matches)), 2), new["Date"].to_numpy()))
+        ].reset_index(drop=True)
+        codes = self._codes(new["Team"].to_numpy())
+        features, self.state = team_features(
+            codes,
+            new[list(self.stats)].to_numpy(),
+            self.windows,
+            self.alphas,
+            self.min_periods,
+            self.state,
+        )
+        new[self.columns] = features
+        new["played"] = new["played"].astype(np.int64)
+        frames = [frame for frame in (self.appearances, new) if len(frame)]
+        self.appearances = pd.concat(frames, ignore_index=True)
+        self.keys = self.keys.append(pd.MultiIndex.from_frame(matches[KEY_COLUMNS]))
+        return self
+
+    def latest(self):
+        """Every team's features after its most recent match."""
+        return (
+            self.appearances.groupby("Team")
+            .tail(1)
+            .set_index("Team")[["Date"] + self.columns]
+        )
+
+    def team_features_asof(self, teams, dates, columns=None):
+        """
+        Features for each (team, date) from the team's last match before that date,
+        NaN for teams with no earlier match, plus ``rest_days`` since that match.
+        """
+        columns = self.columns if columns is None else list(columns)
+        queries = pd.DataFrame(
+            {"Team": np.asarray(teams), "Date": pd.to_datetime(np.asarray(dates))}
+        )
+        queries["query"] = np.arange(len(queries))
+        history = self.appearances[["Date", "Team"] + columns].rename(
+            columns={"Date": "LastDate"}
+        )
+        history["LastDate"] = pd.to_datetime(history["LastDate"])
+        joined = pd.merge_asof(
+            queries.sort_values("Date", kind="mergesort"),
+            history.sort_values("LastDate", kind="mergesort"),
+            left_on="Date",
+            right_on="LastDate",
+            by="Team",
+            allow_exact_matches=False,
+        ).sort_values("query")
+        joined["rest_days"] = (joined["Date"] - joined["LastDate"]).dt.days
+        return joined[columns + ["rest_days"]].reset_index(drop=True)
+
+    def match_features(self, fixtures, columns=None):
+        """
+        Both teams' features going into each fixture, as ``home_`` / ``away_`` columns
+        aligned with ``fixtures``; works for stored matches and future fixtures alike.
+        """
+        sides = []
+        for side, team_column in (("home", "HomeTeam"), ("away", "AwayTeam")):
+            frame = self.team_features_asof(
+                fixtures[team_column], fixtures["Date"], columns
+            )
+            sides.append(frame.add_prefix(side + "_"))
+        return pd.concat(sides, axis=1).set_index(fixtures.index)
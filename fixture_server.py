@@ -0,0 +1,42 @@
+import contextlib
+import functools
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _SlowHandler(SimpleHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive, as against the real site
+    protocol_version = "HTTP/1.1"
+
+    def __init__(self, *args, latency=0.0, **kwargs):
+        self.latency = latency
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve_fixtures(directory, latency=0.0, port=0):
+    """
+    Serve ``directory`` over HTTP on localhost as a stand-in for football-data.co.uk.
+
+    Lay files out as ``<season>/<league>.csv`` and pass the yielded url as ``base_url``
+    to ``get_data``. Every request is delayed by ``latency`` seconds to mimic the real
+    round trip; requests are handled concurrently.
+    """
+    handler = functools.partial(_SlowHandler, directory=directory, latency=latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield "http://127.0.0.1:{}".format(server.server_address[1])
+    finally:
+        server.shutdown()
+        server.server_close()
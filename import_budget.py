@@ -0,0 +1,102 @@
+import argparse
+import json
+import subprocess
+import sys
+
+# the modules pool workers, the prediction service and scripts import
+CORE_MODULES = [
+    "bettools",
+    "dixon_coles",
+    "markets",
+    "staking",
+    "walk_forward",
+    "process_chunk",
+    "backtest",
+    "xi_search",
+    "match_store",
+    "result_store",
+    "monte_carlo",
+    "features",
+    "league_table",
+    "ratings",
+    "prediction_service",
+    "instrumentation",
+]
+# none of which may pull these in at import time
+HEAVY_MODULES = [
+    "matplotlib",
+    "seaborn",
+    "statsmodels",
+    "sklearn",
+    "requests",
+    "scipy.optimize",
+    "scipy.stats",
+    "scipy.special",
+    "scipy.spatial",
+    "scipy.sparse",
+    "scipy.linalg",
+]
+# seconds a module may add on top of numpy and pandas, which everything imports
+IMPORT_BUDGET = 0.1
+
+_PROBE = """
+import json, sys, time
+import numpy, pandas
+start = time.perf_counter()
+import {module}
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def import_cost(module, repeats=3):
+    """
+    Seconds to import ``module`` in a fresh interpreter once numpy and pandas are
+    loaded (best of ``repeats``), and which ``HEAVY_MODULES`` it loaded.
+    """
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+    return min(runs, key=lambda run: run["seconds"])
+
+
+def check_imports(modules=CORE_MODULES, budget=IMPORT_BUDGET, repeats=3):
+    """Import cost per module, with whether it is over budget or loads a heavy module."""
+    results = {}
+    for module in modules:
+        cost = import_cost(module, repeats)
+        cost["ok"] = cost["seconds"] <= budget and not cost["heavy"]
+        results[module] = cost
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check import times of the core.")
+    parser.add_argument("modules", nargs="*", default=CORE_MODULES)
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    results = check_imports(args.modules, args.budget, args.repeats)
+    for module, cost in results.items():
+        print(
+            "{:<20} {:7.1f} ms  {}{}".format(
+                module,
+                cost["seconds"] * 1000,
+                "ok" if cost["ok"] else "OVER BUDGET",
+                "  loads " + ", ".join(cost["heavy"]) if cost["heavy"] else "",
+            )
+        )
+    sys.exit(0 if all(cost["ok"] for cost in results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+# setting this to a path turns on a JsonLinesSink there at import, e.g. in pool workers
+EVENTS_ENV = "FOOTBALL_STATS_EVENTS"
+
+# where events go; with no sink every emit is a single check and nothing is timed
+_SINK = None
+
+
+def _jsonable(value):
+    # numpy scalars and arrays, which json can't serialise on its own
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+class JsonLinesSink:
+    """
+    Append each event as one JSON line to ``path``.
+
+    The file is opened for every event and each line goes out in a single write, so the
+    sink can be pickled to pool workers and any number of processes can share a file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event, default=_jsonable) + "\n"
+        with self._lock, open(self.path, "a") as events_file:
+            events_file.write(line)
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+
+class MemorySink:
+    """
+    Keep events in a list, for a notebook or a run in one process. Pool workers only
+    get an empty copy, so use a ``JsonLinesSink`` to collect their events.
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def __getstate__(self):
+        # a worker's copy starts empty rather than shipping everything collected so far
+        return {"events": []}
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame(self.events)
+
+
+def set_sink(sink):
+    """
+    Send events to ``sink``, any callable taking a dict, or stop sending them with
+    None. Returns the previous sink.
+    """
+    global _SINK
+    previous, _SINK = _SINK, sink
+    return previous
+
+
+def get_sink():
+    return _SINK
+
+
+def enabled():
+    return _SINK is not None
+
+
+@contextlib.contextmanager
+def instrument(sink):
+    """Send events to ``sink`` inside the block, restoring the previous sink after."""
+    previous = set_sink(sink)
+    try:
+        yield sink
+    finally:
+        set_sink(previous)
+
+
+def emit(event, **fields):
+    """Send an event, stamped with the time and process id, to the current sink."""
+    if _SINK is None:
+        return
+    record = {"event": event, "time": time.time(), "pid": os.getpid()}
+    record.update(fields)
+    _SINK(record)
+
+
+class PhaseTimer:
+    """
+    Wall time of consecutive phases: ``lap("optimise")`` at the end of each phase
+    records ``optimise_seconds`` in ``seconds``. Does nothing while no sink is set.
+    """
+
+    def __init__(self):
+        self.active = _SINK is not None
+        self.seconds = {}
+        self.last = time.perf_counter() if self.active else 0.0
+
+    def lap(self, phase):
+        if not self.active:
+            return
+        now = time.perf_counter()
+        self.seconds[phase + "_seconds"] = now - self.last
+        self.last = now
+
+    def total(self):
+        return sum(self.seconds.values())
+
+
+def load_events(path):
+    """A JSON lines event file as a DataFrame, one row per event."""
+    import pandas as pd
+
+    return pd.read_json(path, lines=True, convert_dates=False)
+
+
+if os.environ.get(EVENTS_ENV):
+    set_sink(JsonLinesSink(os.environ[EVENTS_ENV]))
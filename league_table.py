@@ -0,0 +1,312 @@
+import numpy as np
+import pandas as pd
+
+# the running totals kept per team; goal difference is derived from them
+STAT_COLUMNS = [
+    "Played",
+    "Won",
+    "Drawn",
+    "Lost",
+    "Goals For",
+    "Goals Against",
+    "Points",
+]
+TABLE_COLUMNS = STAT_COLUMNS[:6] + ["Goal Difference", "Points"]
+MATCH_COLUMNS = ["Div", "Season", "Date", "HomeTeam", "AwayTeam", "FTHG", "FTAG"]
+# the values used in pythagorean_points.ipynb
+PYTHAG_EXPONENTS = (2.78, 1.24, 1.24, 1.25)
+
+
+def season_codes(dates):
+    """Season codes such as "2324" for match dates, with seasons starting on 1 July."""
+    dates = pd.DatetimeIndex(dates)
+    start = dates.year - (dates.month < 7)
+    return pd.Index(start % 100).map("{:02d}".format) + pd.Index((start + 1) % 100).map(
+        "{:02d}".format
+    )
+
+
+def prepare_matches(matches):
+    """
+    The columns the tables need, with unplayed fixtures dropped.
+
+    ``Season`` is derived from the dates when the frame has none, and a frame without
+    ``Div`` is treated as a single division.
+    """
+    matches = matches.dropna(subset=["FTHG", "FTAG"]).copy()
+    if "Div" not in matches:
+        matches["Div"] = ""
+    if "Season" not in matches:
+        matches["Season"] = season_codes(matches["Date"])
+    matches["FTHG"] = matches["FTHG"].astype(np.int64)
+    matches["FTAG"] = matches["FTAG"].astype(np.int64)
+    return matches[MATCH_COLUMNS].reset_index(drop=True)
+
+
+def appearance_stats(home_goals, away_goals):
+    """Each match's contribution to the home and away team's ``STAT_COLUMNS``."""
+    home_win = (home_goals > away_goals).astype(np.int64)
+    away_win = (home_goals < away_goals).astype(np.int64)
+    draw = 1 - home_win - away_win
+    played = np.ones_like(home_win)
+    home = np.stack(
+        (played, home_win, draw, away_win, home_goals, away_goals, 3 * home_win + draw),
+        axis=1,
+    )
+    away = np.stack(
+        (played, away_win, draw, home_win, away_goals, home_goals, 3 * away_win + draw),
+        axis=1,
+    )
+    return home, away
+
+
+def build_blocks(matches):
+    """
+    Cumulative standings for every division and season in one pass.
+
+    Each (Div, Season) gets a block: its teams, the dates matches were played on, and
+    a (dates, teams, stats) array of every team's running totals after each date. All
+    blocks are stacked into one array so the running totals are a single cumulative
+    sum, with each block's starting totals subtracted back out.
+    """
+    if not len(matches):
+        return {}
+    keys = matches[["Div", "Season"]].drop_duplicates().sort_values(["Div", "Season"])
+    keys = list(keys.itertuples(index=False, name=None))
+    group = pd.MultiIndex.from_tuples(keys).get_indexer(
+        pd.MultiIndex.from_frame(matches[["Div", "Season"]])
+    )
+    teams = np.union1d(matches["HomeTeam"].unique(), matches["AwayTeam"].unique())
+    home_codes = np.searchsorted(teams, matches["HomeTeam"].to_numpy())
+    away_codes = np.searchsorted(teams, matches["AwayTeam"].to_numpy())
+    days = matches["Date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+
+    # one column per (group, team) and one row per (group, date), contiguous per group
+    team_pairs, slot = np.unique(
+        np.concatenate((group, group)) * len(teams)
+        + np.concatenate((home_codes, away_codes)),
+        return_inverse=True,
+    )
+    slot_group = team_pairs // len(teams)
+    column = np.arange(len(team_pairs)) - np.searchsorted(slot_group, slot_group)
+    first_day, last_day = days.min(), days.max()
+    date_pairs, row = np.unique(
+        group * (last_day - first_day + 1) + days - first_day, return_inverse=True
+    )
+    row_group = date_pairs // (last_day - first_day + 1)
+
+    home_stats, away_stats = appearance_stats(
+        matches["FTHG"].to_numpy(), matches["FTAG"].to_numpy()
+    )
+    cumulative = np.zeros(
+        (len(date_pairs), np.bincount(slot_group).max(), len(STAT_COLUMNS)), np.int64
+    )
+    np.add.at(
+        cumulative,
+        (np.concatenate((row, row)), column[slot]),
+        np.concatenate((home_stats, away_stats)),
+    )
+    np.cumsum(cumulative, axis=0, out=cumulative)
+    row_starts = np.searchsorted(row_group, np.arange(len(keys)))
+    row_ends = np.r_[row_starts[1:], len(date_pairs)]
+    slot_starts = np.searchsorted(slot_group, np.arange(len(keys)))
+    slot_ends = np.r_[slot_starts[1:], len(team_pairs)]
+
+    blocks = {}
+    for g, key in enumerate(keys):
+        block = cumulative[row_starts[g] : row_ends[g], : slot_ends[g] - slot_starts[g]]
+        if row_starts[g]:
+            block = block - cumulative[row_starts[g] - 1, : block.shape[1]]
+        blocks[key] = {
+            "teams": teams[team_pairs[slot_starts[g] : slot_ends[g]] % len(teams)],
+            "days": date_pairs[row_starts[g] : row_ends[g]] % (last_day - first_day + 1)
+            + first_day,
+            "cumulative": block,
+        }
+    return blocks
+
+
+def positions(cumulative, teams):
+    """
+    League positions for every row of running totals.
+
+    Teams are ordered by points, goal difference and goals for, as in
+    ``create_league_table``, with any remaining ties broken alphabetically.
+    """
+    points = cumulative[..., STAT_COLUMNS.index("Points")]
+    goals_for = cumulative[..., STAT_COLUMNS.index("Goals For")]
+    goal_difference = goals_for - cumulative[..., STAT_COLUMNS.index("Goals Against")]
+    names = np.broadcast_to(np.argsort(np.argsort(teams)), points.shape)
+    order = np.lexsort((names, -goals_for, -goal_difference, -points), axis=-1)
+    position = np.empty_like(order)
+    np.put_along_axis(
+        position, order, np.broadcast_to(np.arange(1, len(teams) + 1), order.shape), -1
+    )
+    return position
+
+
+def _as_day(date):
+    return np.datetime64(pd.Timestamp(date), "D").astype(np.int64)
+
+
+class LeagueTables:
+    """
+    Standings for every division and season, as of any date.
+
+    Running totals per team are kept for every date a division played on, so a table
+    as of any date is a binary search over those dates and a copy of one row per team.
+    ``update`` takes new results (or a re-download of the current season) and
+    rebuilds only the divisions and seasons they touch.
+    """
+
+    def __init__(self, matches):
+        self.matches = prepare_matches(matches)
+        self.blocks = build_blocks(self.matches)
+
+    def update(self, matches):
+        matches = prepare_matches(matches)
+        touched = matches[["Div", "Season"]].drop_duplicates()
+        stored = self.matches.merge(
+            touched, on=["Div", "Season"], how="left", indicator=True
+        )
+        in_touched = (stored["_merge"] == "both").to_numpy()
+        combined = pd.concat(
+            (self.matches[in_touched], matches), ignore_index=True
+        ).drop_duplicates(
+            ["Div", "Season", "Date", "HomeTeam", "AwayTeam"], keep="last"
+        )
+        self.matches = pd.concat(
+            (self.matches[~in_touched], combined), ignore_index=True
+        )
+        self.blocks.update(build_blocks(combined))
+        return self
+
+    def _row(self, block, date, before):
+        if date is None:
+            return len(block["days"]) - 1
+        side = "left" if before else "right"
+        return np.searchsorted(block["days"], _as_day(date), side=side) - 1
+
+    def table(self, div, season, date=None, before=False):
+        """
+        The table for one division and season after the matches played on or before
+        ``date`` (strictly before it with ``before=True``); the final table by default.
+        """
+        block = self.blocks[(div, season)]
+        row = self._row(block, date, before)
+        totals = (
+            block["cumulative"][row]
+            if row >= 0
+            else np.zeros(block["cumulative"].shape[1:], np.int64)
+        )
+        table = pd.DataFrame(totals, index=block["teams"], columns=STAT_COLUMNS)
+        table["Goal Difference"] = table["Goals For"] - table["Goals Against"]
+        table = table[TABLE_COLUMNS]
+        table["Position"] = positions(totals, block["teams"])
+        return table.sort_values("Position")
+
+    def final_tables(self):
+        """Every division and season's latest table in one frame."""
+        tables = []
+        for div, season in self.blocks:
+            table = self.table(div, season)
+            table.index.name = "Team"
+            table.insert(0, "Season", season)
+            table.insert(0, "Div", div)
+            tables.append(table.reset_index())
+        return pd.concat(tables, ignore_index=True)
+
+    def standings_before(self, matches):
+        """
+        Both teams' standings going into each match, e.g. as model features.
+
+        Returns a frame aligned with ``matches`` holding home_/away_ played, points,
+        goal difference and position from the matches on earlier dates only. Raises
+        ValueError for a match whose division and season aren't in the tables, or whose
+        team doesn't play in that division and season.
+        """
+        matches = matches.copy()
+        if "Div" not in matches:
+            matches["Div"] = ""
+        if "Season" not in matches:
+            matches["Season"] = season_codes(matches["Date"])
+        features = {}
+        for side in ("home", "away"):
+            for name in ("played", "points", "goal_difference", "position"):
+                features["{}_{}".format(side, name)] = np.zeros(len(matches), np.int64)
+        for key, rows in matches.groupby(["Div", "Season"]).indices.items():
+            if key not in self.blocks:
+                raise ValueError("No table for division {!r}, season {!r}".format(*key))
+            block = self.blocks[key]
+            days = matches["Date"].to_numpy()[rows].astype("datetime64[D]")
+            row = np.searchsorted(block["days"], days.astype(np.int64), "left") - 1
+            # a zero row in front stands for the table before the first matchday
+            cumulative = np.concatenate(
+                (np.zeros_like(block["cumulative"][:1]), block["cumulative"])
+            )
+            position = positions(cumulative, block["teams"])
+            for side, team_column in (("home", "HomeTeam"), ("away", "AwayTeam")):
+                names = matches[team_column].to_numpy()[rows]
+                team = np.searchsorted(block["teams"], names)
+                # searchsorted puts an unknown team next to its neighbour's row
+                team = np.minimum(team, len(block["teams"]) - 1)
+                unknown = block["teams"][team] != names
+                if unknown.any():
+                    raise ValueError(
+                        "{!r} is not in the {} {} table".format(names[unknown][0], *key)
+                    )
+                totals = cumulative[row + 1, team]
+                stat = STAT_COLUMNS.index
+                features[side + "_played"][rows] = totals[:, stat("Played")]
+                features[side + "_points"][rows] = totals[:, stat("Points")]
+                features[side + "_goal_difference"][rows] = (
+                    totals[:, stat("Goals For")] - totals[:, stat("Goals Against")]
+                )
+                features[side + "_position"][rows] = position[row + 1, team]
+        return pd.DataFrame(features, index=matches.index)
+
+
+def pythag_expected_points(goals_for, goals_against, games_played, a, b, c, d):
+    pythag_frac = (goals_for**b) / (goals_for**c + goals_against**d)
+
+    return a * pythag_frac * games_played
+
+
+def add_expected_points(table, exponents=PYTHAG_EXPONENTS):
+    """Add an ``Expected Points`` column to a table (or many stacked tables)."""
+    table = table.copy()
+    table["Expected Points"] = pythag_expected_points(
+        table["Goals For"].to_numpy(float),
+        table["Goals Against"].to_numpy(float),
+        table["Played"].to_numpy(float),
+        *exponents
+    )
+    return table
+
+
+def fit_pythag_exponents(tables, initial=PYTHAG_EXPONENTS):
+    """
+    The (a, b, c, d) that best predict points from goals across all ``tables``.
+
+    Least squares over every team row, so fitting on ``final_tables`` pools all
+    divisions and seasons. Returns the exponents and the RMSE in points.
+    """
+    from scipy.optimize import least_squares
+
+    goals_for = tables["Goals For"].to_numpy(float)
+    goals_against = tables["Goals Against"].to_numpy(float)
+    played = tables["Played"].to_numpy(float)
+    points = tables["Points"].to_numpy(float)
+
+    def residuals(exponents):
+        return (
+            pythag_expected_points(goals_for, goals_against, played, *exponents)
+            - points
+        )
+
+    fit = least_squares(residuals, np.asarray(initial, dtype=float))
+    return {
+        "exponents": tuple(float(value) for value in fit.x),
+        "rmse": float(np.sqrt(np.mean(fit.fun**2))),
+        "success": bool(fit.success),
+    }
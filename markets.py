@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+from dixon_coles import get_1x2_probs_batch, get_fixture_cache, lookup_matrices
+
+
+def _score_grids(match_score_matrices):
+    n_goals = match_score_matrices.shape[-1]
+    return np.indices((n_goals, n_goals))
+
+
+def over_under_probs(match_score_matrices, line=2.5):
+    """Probability of the total goals landing over, under or exactly on ``line``."""
+    home_goals, away_goals = _score_grids(match_score_matrices)
+    total = home_goals + away_goals
+    return {
+        "over": np.sum(match_score_matrices * (total > line), axis=(-2, -1)),
+        "under": np.sum(match_score_matrices * (total < line), axis=(-2, -1)),
+        "push": np.sum(match_score_matrices * (total == line), axis=(-2, -1)),
+    }
+
+
+def btts_probs(match_score_matrices):
+    home_goals, away_goals = _score_grids(match_score_matrices)
+    both = (home_goals > 0) & (away_goals > 0)
+    yes = np.sum(match_score_matrices * both, axis=(-2, -1))
+    return {"yes": yes, "no": np.sum(match_score_matrices, axis=(-2, -1)) - yes}
+
+
+def correct_score_probs(match_score_matrices, home_goals, away_goals):
+    return match_score_matrices[..., home_goals, away_goals]
+
+
+def double_chance_probs(match_score_matrices):
+    probs = get_1x2_probs_batch(match_score_matrices)
+    return {
+        "1X": probs["H"] + probs["D"],
+        "12": probs["H"] + probs["A"],
+        "X2": probs["D"] + probs["A"],
+    }
+
+
+def asian_handicap_probs(match_score_matrices, line=0.0):
+    """
+    Win, push and lose probabilities for a home Asian handicap of ``line`` goals.
+
+    Quarter lines (e.g. -0.75) are settled as half the stake on each neighbouring line,
+    so the returned values are the average of the two halves. Expected value is linear
+    in the stake, so ``win * (odds - 1) - lose`` still prices the bet exactly.
+    """
+    if (line * 4) % 2 == 1:
+        halves = [
+            asian_handicap_probs(match_score_matrices, line + step)
+            for step in (-0.25, 0.25)
+        ]
+        return {key: (halves[0][key] + halves[1][key]) / 2 for key in halves[0]}
+    home_goals, away_goals = _score_grids(match_score_matrices)
+    margin = home_goals - away_goals + line
+    return {
+        "win": np.sum(match_score_matrices * (margin > 0), axis=(-2, -1)),
+        "push": np.sum(match_score_matrices * (margin == 0), axis=(-2, -1)),
+        "lose": np.sum(match_score_matrices * (margin < 0), axis=(-2, -1)),
+    }
+
+
+def price_market_board(
+    params,
+    home_teams,
+    away_teams,
+    total_lines=(1.5, 2.5, 3.5),
+    handicap_lines=(-1.5, -1.0, -0.5, 0.0, 0.5),
+    max_goals=10,
+):
+    """
+    Fair probabilities for the standard markets on a list of fixtures.
+
+    Every market is an array reduction over cached score matrices, so pricing a whole
+    round is a lookup plus a few vectorised sums. Returns one row per fixture.
+    """
+    matrices = lookup_matrices(
+        get_fixture_cache(params, max_goals=max_goals), home_teams, away_teams
+    )
+    board = {"HomeTeam": list(home_teams), "AwayTeam": list(away_teams)}
+    board.update(market_probs(matrices, total_lines, handicap_lines))
+    return pd.DataFrame(board)
+
+
+def market_probs(
+    matrices,
+    total_lines=(1.5, 2.5, 3.5),
+    handicap_lines=(-1.5, -1.0, -0.5, 0.0, 0.5),
+):
+    """``price_market_board``'s columns, as a dict of arrays, from score matrices."""
+    board = {}
+    for key, value in get_1x2_probs_batch(matrices).items():
+        board[key] = value
+    board.update(double_chance_probs(matrices))
+    for key, value in btts_probs(matrices).items():
+        board["btts_" + key] = value
+    for line in total_lines:
+        probs = over_under_probs(matrices, line)
+        board["over_{}".format(line)] = probs["over"]
+        board["under_{}".format(line)] = probs["under"]
+    for line in handicap_lines:
+        probs = asian_handicap_probs(matrices, line)
+        for key, value in probs.items():
+            board["ah_{}_{}".format(line, key)] = value
+    return pd.DataFrame(board)
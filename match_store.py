@@ -0,0 +1,196 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b"FSMATCH1"
+# every column block starts on a multiple of this many bytes so it can be viewed in place
+ALIGNMENT = 64
+
+# columns coded against the shared team categories
+TEAM_COLUMNS = ["HomeTeam", "AwayTeam"]
+GOAL_COLUMNS = ["FTHG", "FTAG"]
+EPOCH = np.datetime64("1970-01-01", "D")
+# missing value in int16 numeric columns, outside the range they are encoded from
+# (stores saved before it was recorded in the header used -1)
+MISSING_INT16 = np.iinfo(np.int16).min
+
+
+def _pad(length):
+    return -length % ALIGNMENT
+
+
+def _encode_numeric(values):
+    # whole-number columns such as shots, corners or handicap lines become int16
+    # (MISSING_INT16 for missing), everything else (odds above all) float32
+    values = np.asarray(values, dtype=float)
+    finite = np.isfinite(values)
+    if np.all(values[finite] == np.round(values[finite])) and np.all(
+        np.abs(values[finite]) < np.iinfo(np.int16).max
+    ):
+        return np.where(finite, values, MISSING_INT16).astype(np.int16)
+    return values.astype(np.float32)
+
+
+class MatchStore:
+    """
+    Compact columnar copy of ``get_data`` output.
+
+    Teams (shared between HomeTeam and AwayTeam), divisions, referees and any other text
+    columns are integer codes into ``categories`` (-1 for missing), goals are int8 (-1
+    for matches without a result), dates are int32 days since 1970-01-01, odds are
+    float32 and whole-number columns int16 (``MISSING_INT16`` for missing). Rows are
+    sorted by date. ``save`` writes a single
+    file whose column blocks ``load`` maps straight into memory, so any number of
+    processes can read the same pages without a private copy.
+    """
+
+    def __init__(self, columns, categories, coded, missing_int16=MISSING_INT16):
+        self.columns = columns
+        self.categories = categories
+        # column name -> name of the category list its codes index
+        self.coded = coded
+        self.missing_int16 = missing_int16
+
+    @classmethod
+    def from_frames(cls, df_ls):
+        df = pd.concat(df_ls, ignore_index=True)
+        df = df.sort_values("Date", kind="mergesort").reset_index(drop=True)
+
+        teams = np.union1d(
+            df["HomeTeam"].dropna().unique(), df["AwayTeam"].dropna().unique()
+        )
+        columns = {}
+        categories = {"teams": list(teams)}
+        coded = {}
+        for name in TEAM_COLUMNS:
+            columns[name] = pd.Categorical(df[name], categories=teams).codes.astype(
+                np.int16
+            )
+            coded[name] = "teams"
+        columns["Date"] = (
+            df["Date"].to_numpy().astype("datetime64[D]") - EPOCH
+        ).astype(np.int32)
+        for name in GOAL_COLUMNS:
+            columns[name] = np.nan_to_num(
+                df[name].to_numpy(dtype=float), nan=-1
+            ).astype(np.int8)
+        for name in df.columns:
+            if name in columns:
+                continue
+            if pd.api.types.is_numeric_dtype(df[name]):
+                columns[name] = _encode_numeric(df[name])
+            else:
+                labels = np.sort(df[name].dropna().astype(str).unique())
+                columns[name] = pd.Categorical(
+                    df[name], categories=labels
+                ).codes.astype(np.int16)
+                categories[name] = list(labels)
+                coded[name] = name
+        return cls(columns, categories, coded)
+
+    def __len__(self):
+        return len(self.columns["Date"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    @property
+    def teams(self):
+        return np.array(self.categories["teams"])
+
+    def labels(self, name):
+        """Decoded values of a coded column (None where missing)."""
+        names = np.array(self.categories[self.coded[name]] + [None], dtype=object)
+        return names[self.columns[name]]
+
+    def dates(self):
+        return EPOCH + self.columns["Date"].astype("timedelta64[D]")
+
+    def select(self, rows):
+        """A store over a subset of rows (a slice gives views, not copies)."""
+        return MatchStore(
+            {name: values[rows] for name, values in self.columns.items()},
+            self.categories,
+            self.coded,
+            self.missing_int16,
+        )
+
+    def to_frame(self):
+        """Back to a pandas frame with labels and timestamps, as ``get_data`` returns."""
+        data = {}
+        for name, values in self.columns.items():
+            if name == "Date":
+                data[name] = pd.to_datetime(self.dates())
+            elif name in self.coded:
+                data[name] = self.labels(name)
+            elif name in GOAL_COLUMNS:
+                data[name] = np.where(values < 0, np.nan, values)
+            elif values.dtype == np.int16:
+                data[name] = np.where(values == self.missing_int16, np.nan, values)
+            else:
+                data[name] = values
+        return pd.DataFrame(data)
+
+    def save(self, path):
+        blocks = []
+        offset = 0
+        for name, values in self.columns.items():
+            values = np.ascontiguousarray(values)
+            blocks.append({"name": name, "dtype": values.dtype.str, "offset": offset})
+            offset += values.nbytes + _pad(values.nbytes)
+        header = json.dumps(
+            {
+                "n_rows": len(self),
+                "columns": blocks,
+                "categories": self.categories,
+                "coded": self.coded,
+                "missing_int16": int(self.missing_int16),
+            }
+        ).encode()
+        # magic, header length, header, then padding so the data starts aligned
+        preamble = len(MAGIC) + 8 + len(header)
+        with open(path, "wb") as store_file:
+            store_file.write(MAGIC)
+            store_file.write(np.uint64(len(header)).tobytes())
+            store_file.write(header)
+            store_file.write(b"\0" * _pad(preamble))
+            for values in self.columns.values():
+                values = np.ascontiguousarray(values)
+                store_file.write(values.tobytes())
+                store_file.write(b"\0" * _pad(values.nbytes))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Open a saved store. With ``mmap`` the columns are read-only views onto the
+        file's pages; otherwise they are read into memory.
+        """
+        if mmap:
+            buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        else:
+            buffer = np.fromfile(path, dtype=np.uint8)
+        if bytes(buffer[: len(MAGIC)]) != MAGIC:
+            raise ValueError("{} is not a match store".format(path))
+        header_length = int(buffer[len(MAGIC) : len(MAGIC) + 8].view(np.uint64)[0])
+        header_start = len(MAGIC) + 8
+        header = json.loads(bytes(buffer[header_start : header_start + header_length]))
+        data_start = header_start + header_length
+        data_start += _pad(data_start)
+        n_rows = header["n_rows"]
+        columns = {}
+        for block in header["columns"]:
+            dtype = np.dtype(block["dtype"])
+            start = data_start + block["offset"]
+            columns[block["name"]] = buffer[
+                start : start + n_rows * dtype.itemsize
+            ].view(dtype)
+        return cls(
+            columns,
+            header["categories"],
+            header["coded"],
+            header.get("missing_int16", -1),
+        )
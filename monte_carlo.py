@@ -0,0 +1,147 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from staking import select_bets, strategy_bets
+
+# rough cap on the working arrays of one chunk of paths
+MAX_CHUNK_BYTES = 64 * 2**20
+# float64 (paths x bets) arrays alive at once while simulating a chunk
+_ARRAYS_PER_CHUNK = 4
+
+_BETS = None
+
+
+def _init_worker(bets):
+    global _BETS
+    _BETS = bets
+
+
+def _chunk_paths(n_bets, chunk_paths=None):
+    if chunk_paths is None:
+        chunk_paths = MAX_CHUNK_BYTES // (8 * _ARRAYS_PER_CHUNK * max(n_bets, 1))
+    return max(1, int(chunk_paths))
+
+
+def simulate_chunk(bets, n_paths, seed, method="model"):
+    """
+    Simulate ``n_paths`` bankroll paths over ``bets`` and summarise each one.
+
+    ``method="model"`` redraws every result from the backed selection's probability;
+    ``"bootstrap"`` resamples the historical bets (with their actual results) with
+    replacement. Returns per-path final bankroll, maximum drawdown, turnover, ROI and
+    whether the bankroll ever fell to the ruin level.
+    """
+    rng = np.random.default_rng(seed)
+    n_bets = len(bets["odds"])
+    if method == "model":
+        won = rng.random((n_paths, n_bets)) < bets["prob"]
+        odds, size = bets["odds"], bets["size"]
+    elif method == "bootstrap":
+        picks = rng.integers(0, n_bets, size=(n_paths, n_bets))
+        won, odds, size = bets["won"][picks], bets["odds"][picks], bets["size"][picks]
+    else:
+        raise ValueError("unknown method {}".format(method))
+    returns = np.where(won, odds - 1, -1.0)
+    del won
+
+    start = bets["starting_bankroll"]
+    if bets["kelly"]:
+        # the same compounding as simulate_staking, done in logs
+        bankroll = start * np.exp(np.cumsum(np.log1p(size * returns), axis=1))
+        before = np.hstack((np.full((n_paths, 1), start), bankroll[:, :-1]))
+        turnover = np.sum(size * before, axis=1)
+        del before
+    else:
+        bankroll = start + np.cumsum(size * returns, axis=1)
+        turnover = np.broadcast_to(np.sum(size, axis=-1), (n_paths,)).astype(float)
+    del returns
+
+    peaks = np.maximum(np.maximum.accumulate(bankroll, axis=1), start)
+    max_drawdown = np.max(1 - bankroll / peaks, axis=1)
+    ruined = np.min(bankroll, axis=1) <= bets["ruin_level"] * start
+    final = bankroll[:, -1]
+    profit = final - start
+    roi = np.divide(profit, turnover, out=np.zeros_like(profit), where=turnover > 0)
+    return {
+        "final_bankroll": final,
+        "max_drawdown": max_drawdown,
+        "turnover": turnover,
+        "roi": roi,
+        "ruined": ruined,
+    }
+
+
+def _chunk_task(task):
+    n_paths, seed, method = task
+    return simulate_chunk(_BETS, n_paths, seed, method)
+
+
+def monte_carlo_bankroll(
+    probs,
+    odds,
+    strategy,
+    outcomes=None,
+    method="model",
+    n_paths=100000,
+    starting_bankroll=100,
+    ruin_level=0.1,
+    seed=0,
+    max_workers=None,
+    chunk_paths=None,
+    quantiles=(0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99),
+):
+    """
+    Monte Carlo risk profile of a staking strategy over a sequence of bets.
+
+    Bets are chosen and sized by ``staking.select_bets`` / ``strategy_bets``, so a
+    strategy is simulated exactly as ``simulate_staking`` plays it (Kelly sizes come
+    from ``bettools.kelly_stake_fractions``). Paths are simulated in chunks small enough
+    to keep each worker's arrays near ``MAX_CHUNK_BYTES``; each chunk has its own child
+    of ``SeedSequence(seed)``, so results depend on the seed but not on ``max_workers``.
+    ``outcomes`` are needed for ``method="bootstrap"``. Returns the risk of ruin
+    (falling to ``ruin_level`` of the starting bankroll), quantiles of final bankroll,
+    maximum drawdown and ROI, and the per-path results.
+    """
+    selected = select_bets(probs, odds, outcomes)
+    bet, size = strategy_bets(selected, strategy)
+    if method == "bootstrap" and outcomes is None:
+        raise ValueError("bootstrapping needs the actual outcomes")
+    if not bet.any():
+        raise ValueError("the strategy places no bets")
+    bets = {
+        "prob": selected["prob"][bet],
+        "odds": selected["odds"][bet],
+        "size": size[bet],
+        "won": selected["won"][bet] if outcomes is not None else None,
+        "kelly": strategy["staking"] == "kelly",
+        "starting_bankroll": float(starting_bankroll),
+        "ruin_level": ruin_level,
+    }
+
+    per_chunk = _chunk_paths(len(bets["odds"]), chunk_paths)
+    sizes = [per_chunk] * (n_paths // per_chunk)
+    if n_paths % per_chunk:
+        sizes.append(n_paths % per_chunk)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(size, child, method) for size, child in zip(sizes, seeds)]
+    with ProcessPoolExecutor(
+        max_workers=max_workers or os.cpu_count(),
+        initializer=_init_worker,
+        initargs=(bets,),
+    ) as executor:
+        chunks = list(executor.map(_chunk_task, tasks))
+
+    paths = pd.DataFrame(
+        {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+    )
+    return {
+        "risk_of_ruin": float(paths["ruined"].mean()),
+        "final_bankroll": paths["final_bankroll"].quantile(quantiles),
+        "max_drawdown": paths["max_drawdown"].quantile(quantiles),
+        "roi": paths["roi"].quantile(quantiles),
+        "bets": len(bets["odds"]),
+        "paths": paths,
+    }
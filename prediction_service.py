@@ -0,0 +1,495 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+import numpy as np
+import pandas as pd
+
+from bettools import generate_seasons, get_data, kelly_stake_fractions
+from dixon_coles import build_fixture_cache, get_1x2_probs_batch, params_to_dict
+from markets import market_probs
+from staking import select_bets
+from walk_forward import fit_window
+from xi_search import tuned_xi
+
+MATCH_COLUMNS = ["Date", "HomeTeam", "AwayTeam", "FTHG", "FTAG"]
+KEY_COLUMNS = ["Date", "HomeTeam", "AwayTeam"]
+SELECTIONS = np.array(["Home", "Draw", "Away"])
+# largest request body accepted, so a bad client cannot make the service buffer GBs
+MAX_BODY_BYTES = 1 << 20
+
+
+class RequestError(Exception):
+    def __init__(self, message, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+def prepare_history(matches):
+    """A league's played matches, oldest first, one row per fixture."""
+    matches = matches.dropna(subset=["FTHG", "FTAG"])[MATCH_COLUMNS].copy()
+    matches["Date"] = pd.to_datetime(matches["Date"])
+    matches = matches.drop_duplicates(KEY_COLUMNS, keep="last")
+    return matches.sort_values("Date", kind="mergesort").reset_index(drop=True)
+
+
+def fit_league(matches, xi, previous=None, max_goals=10):
+    """
+    Fit one league's history and precompute everything a price request needs.
+
+    ``previous`` is the last model's ``state`` (team name -> (attack, defence) plus rho
+    and home advantage), which warm-starts the fit exactly as consecutive backtest
+    windows are. Returns a model dict holding the team index, every ordered pair's
+    score matrix (float32, as ``build_fixture_cache``) and 1X2 probabilities, the fit
+    diagnostics and the state for the next refit.
+    """
+    teams = np.union1d(matches["HomeTeam"].unique(), matches["AwayTeam"].unique())
+    home_codes = np.searchsorted(teams, matches["HomeTeam"].to_numpy())
+    away_codes = np.searchsorted(teams, matches["AwayTeam"].to_numpy())
+    days = (matches["Date"] - matches["Date"].min()).dt.days.to_numpy()
+    if previous is not None:
+        # fit_window's states are keyed on team codes, ours on names so they survive
+        # a refit in which teams join the history
+        previous = {
+            (
+                np.searchsorted(teams, key) if key not in ("rho", "home_adv") else key
+            ): value
+            for key, value in previous.items()
+            if key in ("rho", "home_adv") or key in teams
+        }
+    _, fit_info, state = fit_window(
+        home_codes,
+        away_codes,
+        matches["FTHG"].to_numpy(),
+        matches["FTAG"].to_numpy(),
+        days,
+        0,
+        len(matches),
+        0,
+        xi=xi,
+        previous=previous,
+    )
+    attack = np.array([state[code][0] for code in range(len(teams))])
+    defence = np.array([state[code][1] for code in range(len(teams))])
+    params = params_to_dict(
+        teams, np.concatenate((attack, defence, [state["rho"], state["home_adv"]]))
+    )
+    cache = build_fixture_cache(params, max_goals=max_goals)
+    probs = get_1x2_probs_batch(cache["matrices"].astype(float))
+    return {
+        "teams": teams,
+        "team_index": cache["team_index"],
+        "matrices": cache["matrices"],
+        "probs": np.stack((probs["H"], probs["D"], probs["A"]), axis=-1),
+        "params": params,
+        "state": {
+            (teams[key] if key not in ("rho", "home_adv") else key): value
+            for key, value in state.items()
+        },
+        "fit": fit_info,
+        "n_matches": len(matches),
+        "last_date": str(matches["Date"].max().date()),
+        "fitted_at": time.time(),
+    }
+
+
+def _team_codes(model, teams):
+    try:
+        return np.array([model["team_index"][team] for team in teams], dtype=np.intp)
+    except KeyError as error:
+        raise RequestError("unknown team {}".format(error.args[0]))
+
+
+def price_fixtures(model, fixtures, bankroll=None, kelly_fraction=0.05, markets=False):
+    """
+    Prices for a batch of fixtures from a resident model.
+
+    Each fixture is a dict with ``home`` and ``away`` and, optionally, 1X2 ``odds``.
+    Probabilities are a lookup into the model's precomputed arrays; with odds the
+    fixture also gets its EVs and, as ``make_betting_prediction``, the highest-EV
+    selection with its Kelly stake (a bankroll fraction, or an amount when
+    ``bankroll`` is given). ``markets=True`` adds the ``markets.market_probs`` board.
+    """
+    home = _team_codes(model, [fixture["home"] for fixture in fixtures])
+    away = _team_codes(model, [fixture["away"] for fixture in fixtures])
+    probs = model["probs"][home, away]
+    priced = [
+        {"home": fixture["home"], "away": fixture["away"], "probs": row}
+        for fixture, row in zip(fixtures, probs.tolist())
+    ]
+
+    with_odds = [i for i, fixture in enumerate(fixtures) if fixture.get("odds")]
+    if with_odds:
+        odds = np.array([fixtures[i]["odds"] for i in with_odds], dtype=float)
+        if odds.shape != (len(with_odds), 3):
+            raise RequestError("odds must be [home, draw, away]")
+        selected = select_bets(probs[with_odds], odds)
+        stakes = kelly_stake_fractions(
+            selected["prob"], selected["odds"], kelly_fraction
+        )
+        if bankroll is not None:
+            stakes = stakes * bankroll
+        evs = (probs[with_odds] * odds - 1).tolist()
+        for j, i in enumerate(with_odds):
+            priced[i]["ev"] = evs[j]
+            priced[i]["selection"] = str(SELECTIONS[selected["choice"][j]])
+            priced[i]["stake"] = float(stakes[j])
+
+    if markets:
+        board = market_probs(model["matrices"][home, away].astype(float))
+        for key, values in board.items():
+            for fixture, value in zip(priced, values.tolist()):
+                fixture.setdefault("markets", {})[key] = value
+    return priced
+
+
+class PredictionService:
+    """
+    Long-running pricing service with every league's fitted model held in memory.
+
+    Requests only ever read ``models``; a refit runs in a worker process and its
+    result replaces the league's model in a single assignment on the event loop, so a
+    request sees either the old model or the new one, never a mix. New results
+    arriving while a league is refitting are picked up by one more refit afterwards.
+    """
+
+    def __init__(self, histories, xi=None, max_goals=10, refit_workers=1):
+        self.xi = tuned_xi() if xi is None else xi
+        self.max_goals = max_goals
+        self.histories = {
+            league: prepare_history(matches) for league, matches in histories.items()
+        }
+        self.models = {}
+        self.versions = dict.fromkeys(self.histories, 0)
+        self.refit_workers = refit_workers
+        self._executor = None
+        self._refits = {}
+        self._stale = set()
+
+    def fit_all(self):
+        """Fit every league in this process; used once before serving."""
+        for league, history in self.histories.items():
+            self._swap(league, fit_league(history, self.xi, max_goals=self.max_goals))
+        return self
+
+    def _swap(self, league, model):
+        self.versions[league] += 1
+        model["version"] = self.versions[league]
+        self.models[league] = model
+
+    def add_results(self, league, matches):
+        """
+        Merge newly played matches into a league's history and schedule a refit.
+
+        Returns how many matches were new. Must be called on the event loop.
+        """
+        history = self.histories.get(league)
+        combined = prepare_history(
+            pd.concat([frame for frame in (history, matches) if frame is not None])
+        )
+        added = len(combined) - (0 if history is None else len(history))
+        self.histories[league] = combined
+        self.versions.setdefault(league, 0)
+        if added:
+            self._stale.add(league)
+            if league not in self._refits:
+                self._refits[league] = asyncio.get_running_loop().create_task(
+                    self._refit(league)
+                )
+        return added
+
+    async def _refit(self, league):
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.refit_workers)
+        try:
+            while league in self._stale:
+                self._stale.discard(league)
+                previous = self.models.get(league)
+                model = await loop.run_in_executor(
+                    self._executor,
+                    fit_league,
+                    self.histories[league],
+                    self.xi,
+                    None if previous is None else previous["state"],
+                    self.max_goals,
+                )
+                self._swap(league, model)
+        finally:
+            del self._refits[league]
+
+    async def watch_results(self, leagues, season, interval=3600):
+        """
+        Poll ``get_data`` for ``season`` every ``interval`` seconds and add any new
+        results; ``get_data``'s cache decides when the file is actually re-downloaded.
+        A failed poll is reported as a warning and retried at the next interval.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                frames = await loop.run_in_executor(None, get_data, [season], leagues)
+                for league, frame in zip(leagues, frames):
+                    self.add_results(league, frame)
+            except Exception as error:
+                # the site being down for a while must not stop the poller for good
+                warnings.warn(
+                    "Polling {} results failed ({!r}); retrying in {} s".format(
+                        season, error, interval
+                    )
+                )
+            await asyncio.sleep(interval)
+
+    def _model(self, league):
+        if league not in self.models:
+            raise RequestError(
+                "no model for league {}".format(league), HTTPStatus.NOT_FOUND
+            )
+        return self.models[league]
+
+    def health(self):
+        return {
+            league: {
+                "version": model["version"],
+                "teams": len(model["teams"]),
+                "matches": model["n_matches"],
+                "last_date": model["last_date"],
+                "fitted_at": model["fitted_at"],
+                "converged": model["fit"]["converged"],
+                "refitting": league in self._refits,
+            }
+            for league, model in self.models.items()
+        }
+
+    def route(self, method, path, body):
+        """The JSON response to one request; ``RequestError`` becomes an error status."""
+        if method == "GET" and path == "/health":
+            return self.health()
+        if method != "POST":
+            raise RequestError("not found", HTTPStatus.NOT_FOUND)
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise RequestError("body is not valid JSON")
+        if not isinstance(request, dict):
+            raise RequestError("body must be a JSON object")
+        if path == "/predict":
+            model = self._model(request.get("league"))
+            return {
+                "league": request["league"],
+                "version": model["version"],
+                "fixtures": price_fixtures(
+                    model,
+                    request.get("fixtures", []),
+                    bankroll=request.get("bankroll"),
+                    kelly_fraction=request.get("kelly_fraction", 0.05),
+                    markets=request.get("markets", False),
+                ),
+            }
+        if path == "/results":
+            matches = pd.DataFrame(request.get("matches", []), columns=MATCH_COLUMNS)
+            return {"added": self.add_results(request["league"], matches)}
+        raise RequestError("not found", HTTPStatus.NOT_FOUND)
+
+    async def handle(self, reader, writer):
+        # a minimal HTTP/1.1 server: JSON in and out, keep-alive by default
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                try:
+                    if length > MAX_BODY_BYTES:
+                        raise RequestError(
+                            "body too large", HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+                        )
+                    body = await reader.readexactly(length)
+                    status, payload = HTTPStatus.OK, self.route(method, target, body)
+                except RequestError as error:
+                    status, payload = error.status, {"error": str(error)}
+                    if length > MAX_BODY_BYTES:
+                        headers["connection"] = "close"
+                except (KeyError, TypeError, ValueError) as error:
+                    status, payload = HTTPStatus.BAD_REQUEST, {"error": repr(error)}
+                data = json.dumps(payload).encode()
+                keep_alive = (
+                    version == "HTTP/1.1"
+                    and headers.get("connection", "").lower() != "close"
+                )
+                writer.write(
+                    "HTTP/1.1 {} {}\r\nContent-Type: application/json\r\n"
+                    "Content-Length: {}\r\nConnection: {}\r\n\r\n".format(
+                        status.value,
+                        status.phrase,
+                        len(data),
+                        "keep-alive" if keep_alive else "close",
+                    ).encode("latin-1")
+                    + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8765, unix_path=None):
+        """Start listening on a TCP port, or on a Unix socket at ``unix_path``."""
+        if unix_path is not None:
+            return await asyncio.start_unix_server(self.handle, path=unix_path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+@contextlib.contextmanager
+def serve_predictions(service, port=0):
+    """
+    Run ``service`` on localhost in a background thread and yield its url, for
+    notebooks and load tests. The models must already be fitted (``fit_all``).
+    """
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    servers = []
+
+    def run():
+        asyncio.set_event_loop(loop)
+        servers.append(loop.run_until_complete(service.start(port=port)))
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    started.wait()
+    try:
+        yield "http://127.0.0.1:{}".format(servers[0].sockets[0].getsockname()[1])
+    finally:
+
+        async def stop():
+            servers[0].close()
+            await servers[0].wait_closed()
+            for task in list(service._refits.values()):
+                task.cancel()
+
+        asyncio.run_coroutine_threadsafe(stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        service.close()
+
+
+async def _client(host, port, request, n_requests, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(n_requests):
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            headers = await reader.readuntil(b"\r\n\r\n")
+            length = int(
+                next(
+                    line.split(b":")[1]
+                    for line in headers.split(b"\r\n")
+                    if line.lower().startswith(b"content-length")
+                )
+            )
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+def load_test(url, payload, n_requests=10000, connections=8, path="/predict"):
+    """
+    Send ``n_requests`` copies of a JSON request over ``connections`` keep-alive
+    connections and report throughput and latency quantiles in milliseconds.
+    """
+    host, port = url.split("//")[1].split(":")
+    body = json.dumps(payload).encode()
+    request = (
+        "POST {} HTTP/1.1\r\nHost: {}\r\nContent-Type: application/json\r\n"
+        "Content-Length: {}\r\n\r\n".format(path, host, len(body)).encode("latin-1")
+        + body
+    )
+    latencies = []
+
+    async def run():
+        per_client = [n_requests // connections] * connections
+        per_client[0] += n_requests % connections
+        await asyncio.gather(
+            *(
+                _client(host, int(port), request, count, latencies)
+                for count in per_client
+            )
+        )
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "requests_per_second": len(latencies) / elapsed,
+        "latency_ms": dict(
+            zip(
+                ["p50", "p90", "p99", "max"],
+                np.percentile(latencies, [50, 90, 99, 100]),
+            )
+        ),
+    }
+
+
+async def _serve_forever(service, args):
+    server = await service.start(args.host, args.port, args.unix_socket)
+    watcher = asyncio.create_task(
+        service.watch_results(args.leagues, args.seasons[-1], args.poll_interval)
+    )
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        watcher.cancel()
+        service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Dixon-Coles prices over HTTP.")
+    parser.add_argument("--leagues", nargs="+", default=["E0"])
+    parser.add_argument("--start", type=int, default=2023)
+    parser.add_argument("--end", type=int, default=2025)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket")
+    parser.add_argument("--poll-interval", type=float, default=3600)
+    args = parser.parse_args()
+    args.seasons = generate_seasons(args.start, args.end)
+
+    frames = get_data(args.seasons, args.leagues)
+    histories = {
+        league: pd.concat(frames[i :: len(args.leagues)])
+        for i, league in enumerate(args.leagues)
+    }
+    service = PredictionService(histories).fit_all()
+    asyncio.run(_serve_forever(service, args))
+
+
+if __name__ == "__main__":
+    main()
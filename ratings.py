@@ -0,0 +1,204 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# The contrarian rating from https://www.football-data.co.uk/Contrarian.pdf: after every
+# match a team's rating moves by its result minus the market's fair probability of it
+
+
+def market_residuals(home_goals, away_goals, home_prob, away_prob):
+    """Home and away residuals: 1 for a win, 0 otherwise, minus the fair probability."""
+    home_goals = np.asarray(home_goals)
+    away_goals = np.asarray(away_goals)
+    return (
+        (home_goals > away_goals) - np.asarray(home_prob, dtype=float),
+        (home_goals < away_goals) - np.asarray(away_prob, dtype=float),
+    )
+
+
+def rate_codes(home_codes, away_codes, home_residual, away_residual, initial):
+    """
+    Ratings before and after every match, for matches in date order.
+
+    A team's rating after a match is its ``initial`` rating plus the sum of its
+    residuals so far, so each team's appearances are grouped with one sort and
+    summed with a segmented cumulative sum rather than a loop over matches. As in a
+    loop, a missing (NaN) residual leaves that team's ratings NaN from then on without
+    touching anyone else's. Returns a dict of (N,) arrays home_prior, away_prior,
+    home_post, away_post and match_rating (away prior minus home prior), plus the
+    final ``ratings`` per team code.
+    """
+    # home and away appearances interleaved, so position order is date order
+    codes = np.stack((home_codes, away_codes), axis=1).ravel()
+    residuals = np.stack((home_residual, away_residual), axis=1).ravel().astype(float)
+    # group by team, keeping each team's matches in date order
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    missing = np.isnan(residuals[order])
+    sorted_residuals = np.where(missing, 0.0, residuals[order])
+
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    lengths = np.diff(np.r_[starts, len(codes)])
+    # running totals restarted at each team's first match, and likewise the number of
+    # missing residuals so far, which makes the rest of the team's run NaN
+    running = np.cumsum(sorted_residuals)
+    running -= np.repeat(running[starts] - sorted_residuals[starts], lengths)
+    n_missing = np.cumsum(missing)
+    n_missing -= np.repeat(n_missing[starts] - missing[starts], lengths)
+
+    base = initial[sorted_codes].astype(float)
+    post = np.empty(len(codes))
+    prior = np.empty(len(codes))
+    post[order] = np.where(n_missing > 0, np.nan, base + running)
+    prior[order] = np.where(
+        n_missing - missing > 0, np.nan, base + running - sorted_residuals
+    )
+    home_prior, away_prior = prior[0::2], prior[1::2]
+
+    ratings = initial.astype(float).copy()
+    if len(codes):
+        last = np.r_[starts[1:], len(codes)] - 1
+        ratings[sorted_codes[last]] = post[order[last]]
+    return {
+        "home_prior": home_prior,
+        "away_prior": away_prior,
+        "home_post": post[0::2],
+        "away_post": post[1::2],
+        "match_rating": away_prior - home_prior,
+        "ratings": ratings,
+    }
+
+
+def team_components(home_codes, away_codes, n_teams):
+    """
+    Label each team with its connected component of the fixture graph.
+
+    Teams in different components never meet, directly or through promotion and
+    relegation, so their ratings can be computed independently.
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    graph = coo_matrix(
+        (np.ones(len(home_codes)), (home_codes, away_codes)), shape=(n_teams, n_teams)
+    )
+    return connected_components(graph, directed=False)[1]
+
+
+def _rate_partition(task):
+    home_codes, away_codes, home_residual, away_residual, n_teams = task
+    return rate_codes(
+        home_codes, away_codes, home_residual, away_residual, np.zeros(n_teams)
+    )
+
+
+def add_market_ratings(
+    data,
+    home_prob="fair_PSH",
+    away_prob="fair_PSA",
+    probs_are_odds=True,
+    max_workers=None,
+):
+    """
+    Contrarian ratings for a date-sorted match frame, as new columns.
+
+    Adds home_team_prior_rating, away_team_prior_rating, match_rating,
+    home_team_post_rating and away_team_post_rating. The market probabilities come from
+    the ``home_prob`` / ``away_prob`` columns (fair odds by default, so their inverse).
+    Histories that never meet, e.g. the English and Scottish pyramids, are rated in
+    parallel on up to ``max_workers`` processes; with ``max_workers=1`` everything is
+    rated in one pass.
+    """
+    # hashed rather than sorted team codes: the order of the codes doesn't matter here
+    codes, teams = pd.factorize(
+        np.concatenate((data["HomeTeam"].to_numpy(), data["AwayTeam"].to_numpy()))
+    )
+    home_codes, away_codes = codes[: len(data)], codes[len(data) :]
+    home_p = data[home_prob].to_numpy(dtype=float)
+    away_p = data[away_prob].to_numpy(dtype=float)
+    if probs_are_odds:
+        home_p, away_p = 1 / home_p, 1 / away_p
+    home_residual, away_residual = market_residuals(
+        data["FTHG"], data["FTAG"], home_p, away_p
+    )
+
+    if max_workers == 1:
+        labels = np.zeros(len(teams), dtype=np.int64)
+    else:
+        labels = team_components(home_codes, away_codes, len(teams))
+    match_labels = labels[home_codes]
+    tasks, rows_ls = [], []
+    for label in np.unique(match_labels):
+        rows = np.flatnonzero(match_labels == label)
+        part_teams = np.flatnonzero(labels == label)
+        tasks.append(
+            (
+                np.searchsorted(part_teams, home_codes[rows]),
+                np.searchsorted(part_teams, away_codes[rows]),
+                home_residual[rows],
+                away_residual[rows],
+                len(part_teams),
+            )
+        )
+        rows_ls.append(rows)
+    if len(tasks) > 1 and max_workers != 1:
+        with ProcessPoolExecutor(
+            max_workers=min(len(tasks), max_workers or os.cpu_count())
+        ) as executor:
+            results = list(executor.map(_rate_partition, tasks))
+    else:
+        results = [_rate_partition(task) for task in tasks]
+
+    columns = {
+        "home_team_prior_rating": "home_prior",
+        "away_team_prior_rating": "away_prior",
+        "match_rating": "match_rating",
+        "home_team_post_rating": "home_post",
+        "away_team_post_rating": "away_post",
+    }
+    new_columns = {}
+    for column, key in columns.items():
+        values = np.empty(len(data))
+        for rows, result in zip(rows_ls, results):
+            values[rows] = result[key]
+        new_columns[column] = values
+    return data.assign(**new_columns)
+
+
+class MarketRatings:
+    """
+    Running contrarian ratings that can be fed new results as they arrive.
+
+    ``update`` takes the next batch of matches (in date order) and returns the same
+    arrays as ``rate_codes``; teams seen for the first time start from zero. Feeding a
+    history in several batches gives the same ratings as rating it in one go.
+    """
+
+    def __init__(self):
+        self.team_index = {}
+        self.ratings = np.zeros(0)
+
+    def _codes(self, teams):
+        for team in teams:
+            if team not in self.team_index:
+                self.team_index[team] = len(self.team_index)
+        return np.array([self.team_index[team] for team in teams], dtype=np.int64)
+
+    def update(self, home_teams, away_teams, home_residual, away_residual):
+        home_codes = self._codes(home_teams)
+        away_codes = self._codes(away_teams)
+        initial = np.zeros(len(self.team_index))
+        initial[: len(self.ratings)] = self.ratings
+        result = rate_codes(
+            home_codes, away_codes, home_residual, away_residual, initial
+        )
+        self.ratings = result["ratings"]
+        return result
+
+    def rating(self, team):
+        return self.ratings[self.team_index[team]] if team in self.team_index else 0.0
+
+    def to_series(self):
+        return pd.Series(self.ratings, index=list(self.team_index), name="rating")
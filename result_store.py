@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from match_store import MatchStore
+
+# one append-only file per column; a window's rows only count once its line is in the log
+RESULT_COLUMNS = {
+    "row": np.int64,
+    "home_win_prob": np.float32,
+    "draw_win_prob": np.float32,
+    "away_win_prob": np.float32,
+    "fit_converged": np.bool_,
+    "fit_iterations": np.int32,
+    # train_end of the window the fit was warm-started from, -1 for a cold start
+    "fit_warm_start": np.int64,
+}
+LOG_NAME = "windows.log"
+KEY_NAME = "key.json"
+MATCHES_NAME = "matches.fsm"
+
+
+def run_id(key):
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _fsync_append(path, data):
+    with open(path, "ab") as out_file:
+        out_file.write(data)
+        out_file.flush()
+        os.fsync(out_file.fileno())
+
+
+class ResultStore:
+    """
+    Durable, append-only store for one backtest run.
+
+    A run lives in ``<root>/<run id>/``, where the id hashes ``key`` (league set, xi,
+    window sizes, model version...). Each completed window appends its rows to the
+    column files and then a line ``train_start train_end test_size total_rows`` to the
+    window log. Opening the store truncates the columns back to the last logged total,
+    so a crash mid-write leaves no partial window and every window is stored once.
+    Open with ``readonly`` to read a run that another process may still be writing.
+    """
+
+    def __init__(self, root, key, readonly=False):
+        self.key = key
+        self.readonly = readonly
+        self.directory = os.path.join(root, run_id(key))
+        if not readonly:
+            os.makedirs(self.directory, exist_ok=True)
+            key_path = os.path.join(self.directory, KEY_NAME)
+            if not os.path.exists(key_path):
+                with open(key_path, "w") as key_file:
+                    json.dump(key, key_file, sort_keys=True)
+        self.windows = {}
+        self.n_rows = 0
+        self._recover()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _recover(self):
+        log_path = self._path(LOG_NAME)
+        committed = 0
+        if os.path.exists(log_path):
+            with open(log_path, "rb") as log_file:
+                content = log_file.read()
+            # a line without its newline was never committed
+            complete = content[: content.rfind(b"\n") + 1]
+            if len(complete) != len(content) and not self.readonly:
+                with open(log_path, "r+b") as log_file:
+                    log_file.truncate(len(complete))
+            for line in complete.decode().splitlines():
+                train_start, train_end, test_size, total = map(int, line.split())
+                self.windows[(train_start, train_end, test_size)] = total
+                committed = total
+        self.n_rows = committed
+        if self.readonly:
+            return
+        for name, dtype in RESULT_COLUMNS.items():
+            path = self._path(name)
+            size = committed * np.dtype(dtype).itemsize
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                with open(path, "r+b") as column_file:
+                    column_file.truncate(size)
+
+    def __contains__(self, descriptor):
+        return tuple(descriptor) in self.windows
+
+    def pending(self, descriptors):
+        return [descriptor for descriptor in descriptors if descriptor not in self]
+
+    def append(self, descriptor, columns):
+        """Write one window's result columns, then commit it to the log."""
+        if self.readonly:
+            raise ValueError("{} is open read-only".format(self.directory))
+        descriptor = tuple(descriptor)
+        if descriptor in self:
+            return
+        n_new = len(columns["row"])
+        for name, dtype in RESULT_COLUMNS.items():
+            values = np.asarray(columns[name], dtype=dtype)
+            if len(values) != n_new:
+                raise ValueError(
+                    "column {} has {} rows, expected {}".format(
+                        name, len(values), n_new
+                    )
+                )
+            _fsync_append(self._path(name), values.tobytes())
+        self.n_rows += n_new
+        _fsync_append(
+            self._path(LOG_NAME),
+            "{} {} {} {}\n".format(*descriptor, self.n_rows).encode(),
+        )
+        self.windows[descriptor] = self.n_rows
+
+    def save_matches(self, store):
+        """Keep the run's match store alongside the results it indexes."""
+        path = self._path(MATCHES_NAME)
+        temp_path = path + ".tmp"
+        store.save(temp_path)
+        os.replace(temp_path, path)
+        return path
+
+    def matches(self):
+        return MatchStore.load(self._path(MATCHES_NAME))
+
+    def load(self, mmap=True):
+        """Committed result columns as arrays, mapped straight from disk by default."""
+        columns = {}
+        for name, dtype in RESULT_COLUMNS.items():
+            path = self._path(name)
+            if self.n_rows == 0 or not os.path.exists(path):
+                columns[name] = np.empty(0, dtype=dtype)
+            elif mmap:
+                columns[name] = np.memmap(
+                    path, dtype=dtype, mode="r", shape=(self.n_rows,)
+                )
+            else:
+                columns[name] = np.fromfile(path, dtype=dtype, count=self.n_rows)
+        return columns
+
+    def to_frame(self):
+        """Results joined onto their matches, ordered by match."""
+        columns = self.load()
+        order = np.argsort(columns["row"], kind="stable")
+        frame = self.matches().select(columns["row"][order]).to_frame()
+        for name in RESULT_COLUMNS:
+            if name != "row":
+                frame[name] = np.asarray(columns[name][order])
+        return frame
+
+
+def list_runs(root):
+    """The key of every run under ``root``, by run id."""
+    runs = {}
+    if not os.path.isdir(root):
+        return runs
+    for name in sorted(os.listdir(root)):
+        key_path = os.path.join(root, name, KEY_NAME)
+        if os.path.exists(key_path):
+            with open(key_path) as key_file:
+                runs[name] = json.load(key_file)
+    return runs
+
+
+def load_results(root, **filters):
+    """
+    Concatenate the results of every run under ``root`` whose key matches ``filters``
+    (e.g. ``xi=0.00325``), sorted by date. Replaces re-reading a directory of CSVs.
+    """
+    frames = []
+    for key in list_runs(root).values():
+        if all(key.get(name) == value for name, value in filters.items()):
+            store = ResultStore(root, key, readonly=True)
+            if store.n_rows:
+                frames.append(store.to_frame())
+    if not frames:
+        return pd.DataFrame()
+    results = pd.concat(frames, ignore_index=True)
+    return results.sort_values("Date", kind="mergesort").reset_index(drop=True)
@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+from bettools import calculate_ev_from_odds, kelly_stake_fractions
+
+
+def _default_name(label, min_ev, max_ev):
+    if min_ev != 0:
+        label += "_ev>{}".format(min_ev)
+    if max_ev != np.inf:
+        label += "_ev<{}".format(max_ev)
+    return label
+
+
+def flat_strategy(stake=1.0, min_ev=0.0, max_ev=np.inf, name=None):
+    """Bet ``stake`` on every selection whose EV lies strictly between the thresholds."""
+    return {
+        "name": name or _default_name("flat_{}".format(stake), min_ev, max_ev),
+        "staking": "flat",
+        "stake": stake,
+        "min_ev": min_ev,
+        "max_ev": max_ev,
+    }
+
+
+def kelly_strategy(kelly_fraction, min_ev=0.0, max_ev=np.inf, name=None):
+    """Stake ``kelly_fraction`` of the full Kelly bet on the current bankroll."""
+    return {
+        "name": name
+        or _default_name("kelly_{}".format(kelly_fraction), min_ev, max_ev),
+        "staking": "kelly",
+        "kelly_fraction": kelly_fraction,
+        "min_ev": min_ev,
+        "max_ev": max_ev,
+    }
+
+
+def kelly_sweep(kelly_fractions, min_ev=0.0, max_ev=np.inf):
+    return [kelly_strategy(fraction, min_ev, max_ev) for fraction in kelly_fractions]
+
+
+def result_outcomes(home_goals, away_goals):
+    """Which of home / draw / away won each match, as an (N, 3) boolean array."""
+    home_goals = np.asarray(home_goals)
+    away_goals = np.asarray(away_goals)
+    return np.stack(
+        (home_goals > away_goals, home_goals == away_goals, home_goals < away_goals),
+        axis=1,
+    )
+
+
+def _as_columns(values, dtype):
+    values = np.asarray(values, dtype=dtype)
+    return values[:, None] if values.ndim == 1 else values
+
+
+def select_bets(probs, odds, outcomes=None):
+    """
+    The selection each match would back: the one with the highest EV.
+
+    Returns a dict of (N,) arrays with its index (``choice``), EV, probability, odds and,
+    when ``outcomes`` is given, whether it won.
+    """
+    probs = _as_columns(probs, float)
+    odds = _as_columns(odds, float)
+    rows = np.arange(len(probs))
+    ev = np.nan_to_num(calculate_ev_from_odds(odds, probs), nan=-np.inf)
+    choice = np.argmax(ev, axis=1)
+    selected = {
+        "choice": choice,
+        "ev": ev[rows, choice],
+        "prob": probs[rows, choice],
+        "odds": odds[rows, choice],
+    }
+    if outcomes is not None:
+        selected["won"] = _as_columns(outcomes, bool)[rows, choice]
+    return selected
+
+
+def strategy_bets(selected, strategy):
+    """
+    The bets ``strategy`` places on ``select_bets`` output: a mask of matches backed and
+    the Kelly bankroll fraction (Kelly) or fixed amount (flat) staked on each.
+    """
+    bet = (selected["ev"] > strategy["min_ev"]) & (selected["ev"] < strategy["max_ev"])
+    if strategy["staking"] == "kelly":
+        size = kelly_stake_fractions(
+            selected["prob"], selected["odds"], strategy["kelly_fraction"]
+        )
+    else:
+        size = np.full(len(bet), float(strategy["stake"]))
+    return bet, np.where(bet, size, 0.0)
+
+
+def simulate_staking(
+    probs, odds, outcomes, strategies, starting_bankroll=100, index=None
+):
+    """
+    Run every staking strategy over the same sequence of bets in one pass.
+
+    ``probs``, ``odds`` and ``outcomes`` (True where the selection won) are (N,) for a
+    single selection per match or (N, K) for several, e.g. home / draw / away. Each
+    match backs at most one selection, the one with the highest EV, and only when that
+    EV is inside the strategy's thresholds. Kelly bankrolls compound, so their paths
+    are a cumulative product of per-bet growth factors; flat stakes are a cumulative
+    sum. Returns a dict with the bankroll after each bet and the stakes (N x
+    strategies frames), the selection considered on each match, and a summary of final
+    bankroll, bets, turnover, profit, ROI and maximum drawdown per strategy.
+    """
+    selected = select_bets(probs, odds, outcomes)
+    choice = selected["choice"]
+    best_ev = selected["ev"]
+    chosen_probs = selected["prob"][:, None]
+    chosen_odds = selected["odds"][:, None]
+    won = selected["won"][:, None]
+
+    names = [strategy["name"] for strategy in strategies]
+    min_ev = np.array([strategy["min_ev"] for strategy in strategies])
+    max_ev = np.array([strategy["max_ev"] for strategy in strategies])
+    is_kelly = np.array([strategy["staking"] == "kelly" for strategy in strategies])
+    kelly_fraction = np.array(
+        [strategy.get("kelly_fraction", 0.0) for strategy in strategies]
+    )
+    flat_stake = np.array([strategy.get("stake", 0.0) for strategy in strategies])
+
+    bet = (best_ev[:, None] > min_ev) & (best_ev[:, None] < max_ev)
+    # payout per unit staked, net of the stake
+    returns = np.where(won, chosen_odds - 1, -1.0)
+
+    fractions = np.where(
+        bet, kelly_stake_fractions(chosen_probs, chosen_odds, kelly_fraction), 0.0
+    )
+    kelly_paths = starting_bankroll * np.cumprod(1 + fractions * returns, axis=0)
+    flat_stakes = np.where(bet, flat_stake, 0.0)
+    flat_paths = starting_bankroll + np.cumsum(flat_stakes * returns, axis=0)
+    bankroll = np.where(is_kelly, kelly_paths, flat_paths)
+
+    bankroll_before = np.vstack(
+        (np.full((1, len(strategies)), float(starting_bankroll)), bankroll[:-1])
+    )
+    stakes = np.where(is_kelly, fractions * bankroll_before, flat_stakes)
+
+    peaks = np.maximum.accumulate(np.vstack((bankroll_before[:1], bankroll)), axis=0)
+    drawdown = 1 - np.vstack((bankroll_before[:1], bankroll)) / peaks
+    turnover = stakes.sum(axis=0)
+    final = (
+        bankroll[-1] if len(bankroll) else np.full(len(strategies), starting_bankroll)
+    )
+    profit = final - starting_bankroll
+    summary = pd.DataFrame(
+        {
+            "final_bankroll": final,
+            "bets": (stakes > 0).sum(axis=0),
+            "turnover": turnover,
+            "profit": profit,
+            "roi": np.divide(
+                profit, turnover, out=np.zeros_like(profit), where=turnover > 0
+            ),
+            "max_drawdown": drawdown.max(axis=0),
+        },
+        index=pd.Index(names, name="strategy"),
+    )
+    return {
+        "bankroll": pd.DataFrame(bankroll, columns=names, index=index),
+        "stakes": pd.DataFrame(stakes, columns=names, index=index),
+        "selection": choice,
+        "summary": summary,
+    }
@@ -0,0 +1,219 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from dixon_coles import (
+    dixon_coles_simulate_matches,
+    get_1x2_probs_batch,
+    params_to_arrays,
+    params_to_dict,
+)
+
+# roughly top-flight scoring: about 1.5 home and 1.2 away goals a game
+DEFAULT_HOME_ADV = 0.25
+DEFAULT_RHO = -0.08
+DEFAULT_LEVEL = 0.15
+# first matchday of each season, one matchday a week after it
+SEASON_START = (8, 8)
+
+
+def synthetic_params(
+    n_teams=20,
+    seed=0,
+    prefix="Team",
+    attack_sd=0.2,
+    defence_sd=0.18,
+    level=DEFAULT_LEVEL,
+    home_adv=DEFAULT_HOME_ADV,
+    rho=DEFAULT_RHO,
+):
+    """
+    A Dixon-Coles parameter dict for ``n_teams`` made-up teams.
+
+    Attack and defence follow one underlying strength, so good attacks tend to come
+    with good (low) defence parameters. Attack is centred on zero, the same
+    identifiability constraint as ``solve_parameters_decay(reparameterise=True)``.
+    """
+    rng = np.random.default_rng(seed)
+    strength = rng.standard_normal(n_teams)
+    attack = attack_sd * (0.8 * strength + 0.6 * rng.standard_normal(n_teams))
+    defence = level - defence_sd * (0.8 * strength + 0.6 * rng.standard_normal(n_teams))
+    teams = ["{} {:02d}".format(prefix, i + 1) for i in range(n_teams)]
+    return params_to_dict(
+        teams, np.concatenate((attack - attack.mean(), defence, [rho, home_adv]))
+    )
+
+
+def round_robin(n_teams, rng=None):
+    """
+    A double round robin by the circle method: a list of matchdays, each a list of
+    (home, away) team indices. The second half repeats the first with venues swapped.
+    """
+    order = np.arange(n_teams) if rng is None else rng.permutation(n_teams)
+    rotating = list(order)
+    if n_teams % 2:
+        rotating.append(-1)
+    size = len(rotating)
+    first_half = []
+    for matchday in range(size - 1):
+        pairs = []
+        for i in range(size // 2):
+            home, away = rotating[i], rotating[size - 1 - i]
+            if home < 0 or away < 0:
+                continue
+            # alternate venues so no team is at home every week
+            pairs.append((home, away) if (matchday + i) % 2 else (away, home))
+        first_half.append(pairs)
+        rotating = [rotating[0], rotating[-1]] + rotating[1:-1]
+    second_half = [[(away, home) for home, away in pairs] for pairs in first_half]
+    return first_half + second_half
+
+
+def sample_scores(matrices, rng):
+    """One (home, away) score per score matrix, drawn by inverse CDF."""
+    n_goals = matrices.shape[-1]
+    flat = matrices.reshape(len(matrices), -1)
+    cdf = np.cumsum(flat, axis=1)
+    # the tail past max_goals is folded into the last cell
+    draws = rng.random(len(flat)) * cdf[:, -1]
+    cell = np.minimum((cdf < draws[:, None]).sum(axis=1), flat.shape[1] - 1)
+    return np.divmod(cell, n_goals)
+
+
+def synthetic_odds(probs, rng, margin=0.03, noise=0.1, best_price_spread=0.03):
+    """
+    Pinnacle-like and best-price odds around true (N, 3) H/D/A probabilities.
+
+    The bookmaker's probabilities are the truth with log-normal noise, renormalised and
+    then scaled up by ``margin``. Best prices beat them by up to ``best_price_spread``.
+    """
+    log_probs = np.log(probs) + noise * rng.standard_normal(probs.shape)
+    book = np.exp(log_probs)
+    book /= book.sum(axis=1, keepdims=True)
+    odds = 1 / (book * (1 + margin))
+    best = odds * (1 + best_price_spread * rng.random(probs.shape))
+    return np.round(odds, 2), np.round(best, 2)
+
+
+def synthetic_league(
+    n_teams=20,
+    n_seasons=3,
+    seed=0,
+    params=None,
+    div="E0",
+    first_season=2015,
+    margin=0.03,
+    odds_noise=0.1,
+    max_goals=10,
+):
+    """
+    Seasons of a league played out under known Dixon-Coles parameters.
+
+    Every season is a double round robin with one matchday a week from early August,
+    the fixture order reshuffled each season. Scores are drawn from the model's score
+    matrices, odds from noisy versions of its 1X2 probabilities, and shots and corners
+    from Poissons that grow with a side's expected goals. Returns a date-sorted frame
+    with the ``get_data`` columns (plus Season, FTR, HS, AS, HC, AC and the model's
+    ``true_*_prob`` 1X2 probabilities) and the parameter dict it was drawn from. The
+    same seed gives the same league.
+    """
+    rng = np.random.default_rng(seed)
+    if params is None:
+        params = synthetic_params(n_teams, seed=seed)
+    teams, attack, defence, rho, home_adv = params_to_arrays(params)
+
+    home_idx, away_idx, dates, seasons = [], [], [], []
+    for season in range(first_season, first_season + n_seasons):
+        start = pd.Timestamp(season, *SEASON_START)
+        for matchday, pairs in enumerate(round_robin(len(teams), rng)):
+            for home, away in pairs:
+                home_idx.append(home)
+                away_idx.append(away)
+                dates.append(start + pd.Timedelta(weeks=matchday))
+                seasons.append("{:02d}{:02d}".format(season % 100, (season + 1) % 100))
+    home_idx, away_idx = np.array(home_idx), np.array(away_idx)
+
+    matrices = dixon_coles_simulate_matches(
+        attack, defence, rho, home_adv, home_idx, away_idx, max_goals=max_goals
+    )
+    home_goals, away_goals = sample_scores(matrices, rng)
+    probs = get_1x2_probs_batch(matrices)
+    probs = np.stack((probs["H"], probs["D"], probs["A"]), axis=1)
+    probs /= probs.sum(axis=1, keepdims=True)
+    odds, best = synthetic_odds(probs, rng, margin=margin, noise=odds_noise)
+    home_mean = np.exp(attack[home_idx] + defence[away_idx] + home_adv)
+    away_mean = np.exp(defence[home_idx] + attack[away_idx])
+
+    frame = pd.DataFrame(
+        {
+            "Div": div,
+            "Season": seasons,
+            "Date": pd.DatetimeIndex(dates),
+            "HomeTeam": teams[home_idx],
+            "AwayTeam": teams[away_idx],
+            "FTHG": home_goals,
+            "FTAG": away_goals,
+            "FTR": np.select(
+                (home_goals > away_goals, home_goals < away_goals), ("H", "A"), "D"
+            ),
+            "PSH": odds[:, 0],
+            "PSD": odds[:, 1],
+            "PSA": odds[:, 2],
+            "home_max_odds": np.maximum(odds[:, 0], best[:, 0]),
+            "away_max_odds": np.maximum(odds[:, 2], best[:, 2]),
+            "draw_max_odds": np.maximum(odds[:, 1], best[:, 1]),
+            "true_home_prob": probs[:, 0],
+            "true_draw_prob": probs[:, 1],
+            "true_away_prob": probs[:, 2],
+            "HS": rng.poisson(6 + 4 * home_mean),
+            "AS": rng.poisson(6 + 4 * away_mean),
+            "HC": rng.poisson(3 + 1.5 * home_mean),
+            "AC": rng.poisson(3 + 1.5 * away_mean),
+        }
+    )
+    frame = frame.sort_values("Date", kind="mergesort").reset_index(drop=True)
+    return frame, params
+
+
+def synthetic_leagues(
+    divisions=("E0", "E1"), n_teams=20, n_seasons=3, seed=0, **kwargs
+):
+    """
+    ``synthetic_league`` for several divisions with disjoint teams, in one date-sorted
+    frame, and a dict of division -> parameter dict. ``n_teams`` may be a list.
+    """
+    if np.ndim(n_teams) == 0:
+        n_teams = [n_teams] * len(divisions)
+    seeds = np.random.SeedSequence(seed).generate_state(len(divisions))
+    frames, params = [], {}
+    for div, teams, div_seed in zip(divisions, n_teams, seeds):
+        div_params = synthetic_params(teams, seed=int(div_seed), prefix=div)
+        frame, params[div] = synthetic_league(
+            teams, n_seasons, int(div_seed), params=div_params, div=div, **kwargs
+        )
+        frames.append(frame)
+    frame = pd.concat(frames, ignore_index=True)
+    return frame.sort_values("Date", kind="mergesort").reset_index(drop=True), params
+
+
+def write_season_files(frame, directory):
+    """
+    Lay a synthetic frame out as football-data.co.uk does, ``<season>/<Div>.csv`` with
+    dd/mm/YYYY dates, for ``fixture_server.serve_fixtures`` and ``get_data``.
+    """
+    columns = ["Div", "Date", "HomeTeam", "AwayTeam", "FTHG", "FTAG", "FTR"]
+    columns += ["HS", "AS", "HC", "AC", "PSH", "PSD", "PSA"]
+    paths = []
+    for (season, div), season_frame in frame.groupby(["Season", "Div"]):
+        out = season_frame.copy()
+        out["Date"] = out["Date"].dt.strftime("%d/%m/%Y")
+        # the best prices go out as a second bookmaker, so get_data rebuilds them
+        out["B365H"] = season_frame["home_max_odds"]
+        out["B365D"] = season_frame["draw_max_odds"]
+        out["B365A"] = season_frame["away_max_odds"]
+        path = os.path.join(directory, season, div + ".csv")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        out[columns + ["B365H", "B365D", "B365A"]].to_csv(path, index=False)
+        paths.append(path)
+    return paths
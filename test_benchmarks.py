@@ -0,0 +1,19 @@
+import json
+
+from benchmarks import load_results
+
+
+def test_load_results_prefers_the_clean_run(tmp_path):
+    commit = "0123456789ab"
+    for dirty in (False, True):
+        name = "{}{}-quick.json".format(commit, "-dirty" if dirty else "")
+        with open(tmp_path / name, "w") as results_file:
+            json.dump({"commit": commit, "dirty": dirty}, results_file)
+    assert load_results(commit[:7], directory=str(tmp_path))["dirty"] is False
+
+
+def test_load_results_falls_back_to_a_dirty_run(tmp_path):
+    commit = "0123456789ab"
+    with open(tmp_path / "{}-dirty-quick.json".format(commit), "w") as results_file:
+        json.dump({"commit": commit, "dirty": True}, results_file)
+    assert load_results(commit, directory=str(tmp_path))["dirty"] is True
@@ -0,0 +1,55 @@
+import json
+import os
+import time
+
+import pandas as pd
+
+import bettools
+from fixture_server import serve_fixtures
+
+
+def write_season(directory, n_rows, season="1920", league="E0"):
+    path = os.path.join(directory, season, league + ".csv")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pd.DataFrame(
+        {
+            "Div": league,
+            "Date": "10/08/2019",
+            "HomeTeam": ["Home {}".format(i) for i in range(n_rows)],
+            "AwayTeam": ["Away {}".format(i) for i in range(n_rows)],
+            "FTHG": 1,
+            "FTAG": 0,
+        }
+    ).to_csv(path, index=False)
+
+
+def set_fetched(cache_dir, fetched):
+    index_dir = os.path.join(cache_dir, "index")
+    for name in os.listdir(index_dir):
+        path = os.path.join(index_dir, name)
+        with open(path) as index_file:
+            entry = json.load(index_file)
+        entry["fetched"] = fetched
+        with open(path, "w") as index_file:
+            json.dump(entry, index_file)
+
+
+def test_copy_cached_mid_season_is_refreshed_after_it_ends(tmp_path):
+    site, cache_dir = str(tmp_path / "site"), str(tmp_path / "cache")
+    write_season(site, 100)
+    with serve_fixtures(site) as url:
+        assert len(bettools.load_season("1920", "E0", url, cache_dir)) == 100
+        # pretend that copy was fetched in March 2020, before the season finished
+        set_fetched(cache_dir, time.mktime((2020, 3, 1, 12, 0, 0, 0, 0, -1)))
+        write_season(site, 380)
+        assert len(bettools.load_season("1920", "E0", url, cache_dir)) == 380
+
+
+def test_copy_cached_after_season_ends_is_final(tmp_path):
+    site, cache_dir = str(tmp_path / "site"), str(tmp_path / "cache")
+    write_season(site, 380)
+    with serve_fixtures(site) as url:
+        assert len(bettools.load_season("1920", "E0", url, cache_dir)) == 380
+        set_fetched(cache_dir, time.mktime((2020, 8, 1, 12, 0, 0, 0, 0, -1)))
+        write_season(site, 10)
+        assert len(bettools.load_season("1920", "E0", url, cache_dir)) == 380
@@ -0,0 +1,30 @@
+import warnings
+
+import pytest
+
+import instrumentation
+from process_chunk import process_chunk
+from synthetic import synthetic_league
+
+
+@pytest.fixture
+def data():
+    frame, _ = synthetic_league(n_teams=10, n_seasons=2, seed=2)
+    return frame.set_index("Date")
+
+
+def test_failed_chunk_warns_without_a_sink(data):
+    previous = instrumentation.set_sink(None)
+    try:
+        with pytest.warns(UserWarning, match="Error processing chunk"):
+            assert process_chunk((data, 0)) is None
+    finally:
+        instrumentation.set_sink(previous)
+
+
+def test_failed_chunk_is_only_emitted_with_a_sink(data):
+    with instrumentation.instrument(instrumentation.MemorySink()) as sink:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            assert process_chunk((data, 0)) is None
+    assert [event["event"] for event in sink.events] == ["chunk_error"]
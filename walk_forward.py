@@ -0,0 +1,230 @@
+import numpy as np
+
+from dixon_coles import (
+    DEFAULT_XI,
+    decay_weights,
+    dixon_coles_simulate_matches,
+    emit_fit,
+    fit_diagnostics,
+    get_1x2_probs_batch,
+    params_to_arrays,
+    params_to_dict,
+    prepare_match_arrays,
+    solve_parameters_arrays,
+)
+from instrumentation import PhaseTimer
+
+# home advantage a cold window fit starts from, about exp(0.25) more home goals
+COLD_START_HOME_ADV = 0.25
+
+
+def encode_match_frame(data):
+    """
+    Integer-encode a date-indexed match frame once for the whole backtest.
+
+    Returns the sorted team names, the home and away team codes and the match dates as
+    day numbers, so each window only needs array slices instead of a fresh frame.
+    """
+    teams = np.union1d(data["HomeTeam"].unique(), data["AwayTeam"].unique())
+    home_codes = np.searchsorted(teams, data["HomeTeam"].to_numpy())
+    away_codes = np.searchsorted(teams, data["AwayTeam"].to_numpy())
+    days = (data.index - data.index.min()).days.to_numpy()
+    return teams, home_codes, away_codes, days
+
+
+def warm_start_values(previous, window_codes):
+    """
+    Initial values for a window, carried forward from the previous window's fit.
+
+    ``previous`` maps team code -> (attack, defence) plus "rho" and "home_adv". Teams
+    entering the window are mostly promoted sides, so they start from the average of
+    the teams that dropped out of it, or of the three weakest known teams when nobody
+    dropped out.
+    """
+    known = {
+        code: value
+        for code, value in previous.items()
+        if code not in ("rho", "home_adv") and code in window_codes
+    }
+    departed = [
+        value
+        for code, value in previous.items()
+        if code not in ("rho", "home_adv") and code not in window_codes
+    ]
+    if not departed:
+        # weakest by attack minus defence (a higher defence value concedes more)
+        departed = sorted(known.values(), key=lambda value: value[0] - value[1])[:3]
+    prior = np.mean(departed, axis=0)
+    strengths = np.array([known.get(code, prior) for code in window_codes])
+    return np.concatenate(
+        (strengths[:, 0], strengths[:, 1], [previous["rho"], previous["home_adv"]])
+    )
+
+
+def with_entry_priors(params, teams):
+    """
+    A fitted parameter dict extended to ``teams``, the ones it lacks getting the same
+    entry prior ``fit_window`` gives teams new to a window.
+    """
+    fitted, attack, defence, rho, home_adv = params_to_arrays(params)
+    state = dict(zip(fitted, zip(attack, defence)))
+    state["rho"], state["home_adv"] = rho, home_adv
+    teams = np.union1d(fitted, teams)
+    return params_to_dict(teams, warm_start_values(state, teams))
+
+
+def fit_window(
+    home_codes,
+    away_codes,
+    home_goals,
+    away_goals,
+    days,
+    train_start,
+    train_end,
+    test_size,
+    xi=DEFAULT_XI,
+    previous=None,
+    options={"maxiter": 200},
+):
+    """
+    Fit one walk-forward window from whole-history arrays and predict the next
+    ``test_size`` matches.
+
+    Team codes index one global team list, ``days`` are match day numbers. When
+    ``previous`` (the state returned by the last call) is given the fit is warm-started
+    from it. Returns the 1X2 probabilities of the test block as a dict of arrays, the
+    fit diagnostics and the state to pass to the next window. With instrumentation on,
+    each call emits a ``window_fit`` event timing its prepare, optimise and predict
+    phases.
+    """
+    timer = PhaseTimer()
+    test_end = train_end + test_size
+    window = slice(train_start, train_end)
+    window_codes = np.union1d(home_codes[window], away_codes[window])
+    n_teams = len(window_codes)
+    # days since the last training match, shifted per window rather than rebuilt
+    time_diff = days[train_end - 1] - days[window]
+    matches = prepare_match_arrays(
+        np.searchsorted(window_codes, home_codes[window]),
+        np.searchsorted(window_codes, away_codes[window]),
+        home_goals[window],
+        away_goals[window],
+        weights=decay_weights(time_diff, xi),
+    )
+    # cold fits start from level teams rather than the solver's random values, so a
+    # window's fit depends only on its data and warm start
+    init_vals = np.concatenate((np.zeros(2 * n_teams), [0.0, COLD_START_HOME_ADV]))
+    method = "L-BFGS-B"
+    if previous is not None:
+        # from a warm start Newton steps on the exact Hessian converge in a few iterations
+        init_vals, method = warm_start_values(previous, window_codes), "trust-exact"
+    timer.lap("prepare")
+    opt_output = solve_parameters_arrays(
+        matches,
+        n_teams,
+        init_vals=init_vals,
+        options=options,
+        reparameterise=True,
+        method=method,
+    )
+    timer.lap("optimise")
+    warm_start = previous is not None
+    x = opt_output.x
+    previous = {code: (x[i], x[n_teams + i]) for i, code in enumerate(window_codes)}
+    previous["rho"], previous["home_adv"] = x[-2], x[-1]
+
+    # teams in the test block that the window has not seen get the entry prior
+    test_home, test_away = (
+        home_codes[train_end:test_end],
+        away_codes[train_end:test_end],
+    )
+    predict_codes = np.union1d(window_codes, np.append(test_home, test_away))
+    values = warm_start_values(previous, predict_codes)
+    n_predict = len(predict_codes)
+    probs = get_1x2_probs_batch(
+        dixon_coles_simulate_matches(
+            values[:n_predict],
+            values[n_predict : (2 * n_predict)],
+            values[-2],
+            values[-1],
+            np.searchsorted(predict_codes, test_home),
+            np.searchsorted(predict_codes, test_away),
+        )
+    )
+    timer.lap("predict")
+    emit_fit(
+        "window_fit",
+        opt_output,
+        matches,
+        n_teams,
+        timer,
+        train_start=int(train_start),
+        train_end=int(train_end),
+        test_size=int(test_size),
+        xi=xi,
+        warm_start=warm_start,
+    )
+    return probs, fit_diagnostics(opt_output), previous
+
+
+def walk_forward_validation(
+    data,
+    initial_train_size,
+    test_size,
+    num_iterations,
+    xi=DEFAULT_XI,
+    warm_start=True,
+    expanding=False,
+    options={"maxiter": 200},
+):
+    """
+    Walk-forward Dixon-Coles backtest over a date-indexed, date-sorted match frame.
+
+    Each window is fitted with the reparameterised solver and, when ``warm_start`` is
+    set, initialised from the previous window's parameters, so consecutive fits only
+    need to absorb ``test_size`` new matches. Returns a list of test frames with
+    ``home_win_prob``, ``away_win_prob`` and ``draw_win_prob`` plus fit diagnostics,
+    in the same shape as ``process_chunk`` output. Windows roll forward by
+    ``test_size`` matches, or grow from the first match when ``expanding`` is set.
+    """
+    _, home_codes, away_codes, days = encode_match_frame(data)
+    home_goals = data["FTHG"].to_numpy()
+    away_goals = data["FTAG"].to_numpy()
+
+    results = []
+    previous = None
+    train_start = 0
+    train_end = initial_train_size
+    for _ in range(num_iterations):
+        test_end = train_end + test_size
+        if test_end > len(data):
+            break
+        probs, fit_info, state = fit_window(
+            home_codes,
+            away_codes,
+            home_goals,
+            away_goals,
+            days,
+            train_start,
+            train_end,
+            test_size,
+            xi=xi,
+            previous=previous,
+            options=options,
+        )
+        if warm_start:
+            previous = state
+
+        test_data = data.iloc[train_end:test_end].reset_index()
+        test_data["fit_converged"] = fit_info["converged"]
+        test_data["fit_iterations"] = fit_info["iterations"]
+        test_data["fit_grad_norm"] = fit_info["grad_norm"]
+        test_data["home_win_prob"] = probs["H"]
+        test_data["away_win_prob"] = probs["A"]
+        test_data["draw_win_prob"] = probs["D"]
+        results.append(test_data)
+
+        if not expanding:
+            train_start += test_size
+        train_end = test_end
+    return results
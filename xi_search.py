@@ -0,0 +1,268 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from bettools import DEFAULT_CACHE_DIR
+from dixon_coles import DEFAULT_XI
+from walk_forward import fit_window
+
+# the cutoffs get_total_score_xi has always used: 3-day test blocks over the last 100 days
+DEFAULT_CUTOFFS = tuple(range(99, -1, -3))
+# tuned values live with the data cache, not in the package, unless pointed elsewhere
+TUNED_XI_PATH = os.environ.get(
+    "FOOTBALL_STATS_TUNED_XI",
+    os.path.join(DEFAULT_CACHE_DIR, "tuned_xi.json"),
+)
+GOLDEN_RATIO = (np.sqrt(5) - 1) / 2
+
+_DATA = None
+
+
+def prepare_xi_data(dataset):
+    """
+    Encode a frame with ``time_diff`` (days before the latest match) once for the search.
+
+    Rows are ordered oldest first, so every cutoff's training set is a prefix of the
+    arrays and its 3-day test block the slice right after it.
+    """
+    dataset = dataset.sort_values("time_diff", ascending=False, kind="mergesort")
+    teams = np.union1d(dataset["HomeTeam"].unique(), dataset["AwayTeam"].unique())
+    return {
+        "teams": teams,
+        "home_codes": np.searchsorted(teams, dataset["HomeTeam"].to_numpy()),
+        "away_codes": np.searchsorted(teams, dataset["AwayTeam"].to_numpy()),
+        "home_goals": dataset["FTHG"].to_numpy(),
+        "away_goals": dataset["FTAG"].to_numpy(),
+        "days": -dataset["time_diff"].to_numpy(),
+        "result": dataset["FTR"].map({"H": 0, "D": 1, "A": 2}).to_numpy(),
+    }
+
+
+def _init_worker(data):
+    global _DATA
+    _DATA = data
+
+
+def score_cutoffs(data, xi, cutoffs, previous=None):
+    """
+    Fit on everything before each cutoff and score the next 3 days of matches.
+
+    Cutoffs are walked in order, each fit warm-started from the last (or ``previous``).
+    Returns a dict per cutoff with the summed log-probability of the actual results
+    (``build_temp_model``'s score), the match count, fit diagnostics and the fitted
+    state for warm-starting other fits at the same cutoff.
+    """
+    scores = {}
+    for cutoff in cutoffs:
+        train_end = np.searchsorted(data["days"], -cutoff, side="left")
+        test_end = np.searchsorted(data["days"], 2 - cutoff, side="right")
+        if train_end == test_end or train_end == 0:
+            scores[cutoff] = {"score": 0.0, "n": 0, "converged": True, "iterations": 0}
+            scores[cutoff]["state"] = previous
+            continue
+        probs, fit_info, previous = fit_window(
+            data["home_codes"],
+            data["away_codes"],
+            data["home_goals"],
+            data["away_goals"],
+            data["days"],
+            0,
+            train_end,
+            test_end - train_end,
+            xi=xi,
+            previous=previous,
+        )
+        outcome_probs = np.stack((probs["H"], probs["D"], probs["A"]), axis=1)
+        actual = outcome_probs[
+            np.arange(test_end - train_end), data["result"][train_end:test_end]
+        ]
+        scores[cutoff] = {
+            "score": float(np.sum(np.log(actual))),
+            "n": int(test_end - train_end),
+            "converged": fit_info["converged"],
+            "iterations": fit_info["iterations"],
+            "state": previous,
+        }
+    return scores
+
+
+def _score_task(task):
+    # a contiguous run of xi values over a contiguous run of cutoffs; the first cutoff
+    # of each xi starts from the same cutoff's fit at the previous xi
+    xis, cutoffs, previous = task
+    results = {}
+    for xi in xis:
+        scores = score_cutoffs(_DATA, xi, cutoffs, previous)
+        previous = scores[cutoffs[0]]["state"]
+        for cutoff, entry in scores.items():
+            results[(xi, cutoff)] = entry
+    return results
+
+
+def _nearest_state(cache, xi, cutoff):
+    fitted = [
+        key
+        for key, entry in cache.items()
+        if key[1] == cutoff and entry["state"] is not None
+    ]
+    if not fitted:
+        return None
+    return cache[min(fitted, key=lambda key: abs(key[0] - xi))]["state"]
+
+
+def _split(values, n_blocks):
+    return [block.tolist() for block in np.array_split(values, n_blocks) if len(block)]
+
+
+def evaluate_xis(executor, xis, cutoffs, cache, max_workers):
+    """
+    Score every (xi, cutoff) pair not already in ``cache``, spread over the executor.
+
+    Many xi values are split into contiguous blocks, one per worker; a few are split
+    along the cutoff path instead so all workers stay busy. Every block starts from the
+    cached fit at the nearest xi for its first cutoff.
+    """
+    xis = [float(xi) for xi in xis if any((float(xi), c) not in cache for c in cutoffs)]
+    if not xis:
+        return cache
+    if len(xis) >= max_workers:
+        blocks = [(block, list(cutoffs)) for block in _split(xis, max_workers)]
+    else:
+        n_cutoff_blocks = max(1, max_workers // len(xis))
+        blocks = [
+            ([xi], [int(c) for c in block])
+            for xi in xis
+            for block in _split(cutoffs, n_cutoff_blocks)
+        ]
+    tasks = [
+        (
+            block_xis,
+            block_cutoffs,
+            _nearest_state(cache, block_xis[0], block_cutoffs[0]),
+        )
+        for block_xis, block_cutoffs in blocks
+    ]
+    for results in executor.map(_score_task, tasks):
+        cache.update(results)
+    return cache
+
+
+def log_loss(cache, xi, cutoffs):
+    entries = [cache[(float(xi), cutoff)] for cutoff in cutoffs]
+    n = sum(entry["n"] for entry in entries)
+    return -sum(entry["score"] for entry in entries) / n
+
+
+def search_result(cache, cutoffs):
+    """
+    Summarise every xi in ``cache`` scored over all ``cutoffs``.
+
+    Returns the best xi and its log-loss, the log-loss curve over xi, per-cutoff
+    log-loss (cutoffs x xi), the share of converged fits per xi and the cache itself,
+    which can be passed back in to extend the search on the same data.
+    """
+    xis = sorted({xi for xi, cutoff in cache if all((xi, c) in cache for c in cutoffs)})
+    curve = pd.Series([log_loss(cache, xi, cutoffs) for xi in xis], index=xis)
+    curve.index.name = "xi"
+    per_cutoff = pd.DataFrame(
+        {
+            xi: [
+                (
+                    -cache[(xi, c)]["score"] / cache[(xi, c)]["n"]
+                    if cache[(xi, c)]["n"]
+                    else np.nan
+                )
+                for c in cutoffs
+            ]
+            for xi in xis
+        },
+        index=list(cutoffs),
+    )
+    per_cutoff.index.name = "cutoff"
+    converged = pd.Series(
+        [np.mean([cache[(xi, c)]["converged"] for c in cutoffs]) for xi in xis],
+        index=curve.index,
+    )
+    return {
+        "xi": float(curve.idxmin()),
+        "log_loss": float(curve.min()),
+        "curve": curve,
+        "per_cutoff": per_cutoff,
+        "converged": converged,
+        "cache": cache,
+    }
+
+
+def grid_search_xi(dataset, xis, cutoffs=DEFAULT_CUTOFFS, max_workers=7, cache=None):
+    """Log-loss of every xi in ``xis`` over the cutoffs, evaluated in parallel."""
+    cache = {} if cache is None else cache
+    data = prepare_xi_data(dataset)
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_init_worker, initargs=(data,)
+    ) as executor:
+        evaluate_xis(executor, sorted(xis), cutoffs, cache, max_workers)
+    return search_result(cache, cutoffs)
+
+
+def golden_section_xi(
+    dataset,
+    lower=0.0,
+    upper=0.01,
+    tol=2.5e-4,
+    cutoffs=DEFAULT_CUTOFFS,
+    max_workers=7,
+    cache=None,
+):
+    """
+    Golden-section search for the xi with the lowest log-loss in [lower, upper].
+
+    Each step scores one new xi, split along the cutoff path across workers and
+    warm-started from the nearest xi already fitted.
+    """
+    cache = {} if cache is None else cache
+    data = prepare_xi_data(dataset)
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_init_worker, initargs=(data,)
+    ) as executor:
+        left = upper - GOLDEN_RATIO * (upper - lower)
+        right = lower + GOLDEN_RATIO * (upper - lower)
+        evaluate_xis(executor, [left, right], cutoffs, cache, max_workers)
+        while upper - lower > tol:
+            if log_loss(cache, left, cutoffs) < log_loss(cache, right, cutoffs):
+                upper, right = right, left
+                left = upper - GOLDEN_RATIO * (upper - lower)
+                evaluate_xis(executor, [left], cutoffs, cache, max_workers)
+            else:
+                lower, left = left, right
+                right = lower + GOLDEN_RATIO * (upper - lower)
+                evaluate_xis(executor, [right], cutoffs, cache, max_workers)
+    return search_result(cache, cutoffs)
+
+
+def save_tuned_xi(result, name="default", path=TUNED_XI_PATH):
+    """Record a search's best xi under ``name`` for ``tuned_xi`` to pick up."""
+    tuned = {}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if os.path.exists(path):
+        with open(path) as tuned_file:
+            tuned = json.load(tuned_file)
+    tuned[name] = {"xi": result["xi"], "log_loss": result["log_loss"]}
+    with open(path, "w") as tuned_file:
+        json.dump(tuned, tuned_file, indent=2, sort_keys=True)
+
+
+def tuned_xi(name="default", path=TUNED_XI_PATH):
+    """
+    The xi saved by ``save_tuned_xi``, or ``DEFAULT_XI`` when ``path`` is None, the
+    file doesn't exist or nothing has been saved under ``name``.
+    """
+    if path is None or not os.path.exists(path):
+        return DEFAULT_XI
+    with open(path) as tuned_file:
+        tuned = json.load(tuned_file)
+    if name not in tuned:
+        return DEFAULT_XI
+    return tuned[name]["xi"]